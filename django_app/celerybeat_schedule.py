@@ -2,9 +2,11 @@ from celery.schedules import crontab
 
 # Celery Beat Schedule
 CELERYBEAT_SCHEDULE = {
-    'regenerate-energy': {
-        'task': 'clicker_app.tasks.regenerate_energy',
-        'schedule': 30.0,  # Every 30 seconds
+    # Energy is regenerated on read (Player.get_current_energy), so
+    # clicker_app.tasks.regenerate_energy no longer needs to be scheduled
+    'flush-clicks': {
+        'task': 'clicker_app.tasks.flush_clicks',
+        'schedule': 0.5,  # Every 500 ms
     },
     'update-leaderboard': {
         'task': 'clicker_app.tasks.update_leaderboard',
@@ -14,6 +16,14 @@ CELERYBEAT_SCHEDULE = {
         'task': 'clicker_app.tasks.update_task_progress',
         'schedule': 3600.0,  # Every hour
     },
+    'maintain-click-events': {
+        'task': 'clicker_app.tasks.maintain_click_events',
+        'schedule': crontab(hour=2, minute=0),  # Daily at 02:00
+    },
+    'compact-daily-reward-history': {
+        'task': 'clicker_app.tasks.compact_daily_reward_history',
+        'schedule': crontab(hour=3, minute=0),  # Daily at 03:00
+    },
 }
 
 # Timezone for the Celery beat scheduler
@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Player, Upgrade, PlayerUpgrade, DailyReward, PlayerDailyReward, Task, PlayerTask, Referral
+from .models import (
+    Player, Upgrade, PlayerUpgrade, DailyReward, PlayerDailyReward, PlayerDailyRewardSummary, Task, PlayerTask,
+    Referral
+)
 
 
 @admin.register(Player)
@@ -7,7 +10,13 @@ class PlayerAdmin(admin.ModelAdmin):
     list_display = ['username', 'user', 'balance', 'level', 'energy', 'last_login', 'created_at']
     list_filter = ['level', 'is_verified', 'created_at']
     search_fields = ['username', 'user__username']
-    readonly_fields = ['created_at', 'last_login', 'last_energy_update']
+    readonly_fields = ['created_at', 'last_login', 'last_energy_update', 'version']
+
+    def save_model(self, request, obj, form, change):
+        # Edited game state must not be served from cached copies or ETags
+        if change:
+            obj.bump_version()
+        super().save_model(request, obj, form, change)
 
 
 @admin.register(Upgrade)
@@ -39,6 +48,13 @@ class PlayerDailyRewardAdmin(admin.ModelAdmin):
     search_fields = ['player__username']
 
 
+@admin.register(PlayerDailyRewardSummary)
+class PlayerDailyRewardSummaryAdmin(admin.ModelAdmin):
+    list_display = ['player', 'month', 'claims', 'consecutive_claims', 'coins']
+    list_filter = ['month']
+    search_fields = ['player__username']
+
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ['name', 'task_type', 'target_value', 'reward_coins', 'is_active', 'order']
@@ -0,0 +1,213 @@
+import functools
+import json
+
+from asgiref.sync import sync_to_async
+from django.db.models import F
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import AuthenticationFailed, PermissionDenied
+
+from .authentication import PlayerTokenAuthentication, TelegramInitDataAuthentication
+from .click_buffer import get_store, merge_pending
+from .clicks import apply_clicks
+from .conditional import make_etag, not_modified, tag_response
+from .models import Player
+from .player_cache import get_player_cache
+from .payloads import PayloadError, parse_click, parse_sync
+from .serializers import PlayerSerializer
+from .task_progress import complete_tasks
+from .views import LAST_LOGIN_RESOLUTION
+
+
+# Async counterparts of the hottest API views, for ASGI deployments.
+#
+# DRF views are sync only, so these are plain Django async views that keep
+# the same request/response format. Under an ASGI server a request waiting
+# on the database no longer holds a worker thread; ORM calls go through the
+# async ORM API and raw SQL through sync_to_async.
+
+
+def authenticate_credentials(request):
+    """
+    Player token or Telegram authentication, as DRF tries them; off the
+    event loop, as the token denylist is read from the cache and Telegram
+    may create the player on first sight
+    """
+    auth = PlayerTokenAuthentication().authenticate(request)
+    if auth is None:
+        auth = TelegramInitDataAuthentication().authenticate(request)
+    return auth
+
+
+def api_login_required(view):
+    """
+    Async equivalent of @permission_classes([IsAuthenticated]) with player
+    token, Telegram or session authentication: passes the authenticated user to the
+    view, or answers 401/403 like DRF does. As with DRF, CSRF is checked
+    only for requests authenticated by the session cookie.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            auth = await sync_to_async(authenticate_credentials)(request)
+        except AuthenticationFailed as e:
+            response = JsonResponse({'detail': str(e.detail)}, status=401)
+            # DRF names the first authentication scheme on its 401s
+            response['WWW-Authenticate'] = PlayerTokenAuthentication().authenticate_header(request)
+            return response
+        if auth:
+            user = auth[0]
+        else:
+            user = await request.auser()
+            if user.is_authenticated:
+                try:
+                    SessionAuthentication().enforce_csrf(request)
+                except PermissionDenied as e:
+                    return JsonResponse({'detail': str(e.detail)}, status=403)
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                status=403)
+        return await view(request, user, *args, **kwargs)
+
+    # Header-authenticated clients carry no CSRF token: the check above
+    # replaces CsrfViewMiddleware's
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+def parse_body(request):
+    """Return the request payload as a dict, or None if it is malformed"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST.dict()
+
+
+async def pending_deltas(store, player):
+    if store is None:
+        return 0, 0
+    return await sync_to_async(store.pending)(player.pk)
+
+
+@require_GET
+@api_login_required
+async def player_profile(request, user):
+    """
+    Get player profile information
+    """
+    player_cache = get_player_cache()
+    player = await player_cache.aget(user.id)
+    if player is None:
+        # Create player profile if it doesn't exist
+        await Player.objects.acreate(user=user)
+        player = await player_cache.aget(user.id)
+
+    # Update last login, at most once every few minutes
+    now = timezone.now()
+    if now - player.last_login > LAST_LOGIN_RESOLUTION:
+        await Player.objects.filter(pk=player.pk).aupdate(
+            last_login=now, version=F('version') + 1
+        )
+        await player_cache.ainvalidate(user.id)
+        player = player._replace(last_login=now, version=player.version + 1)
+
+    store = get_store()
+    pending = await pending_deltas(store, player)
+    etag = make_etag('player', player.pk, player.version, player.get_current_energy(), *pending)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+
+    data = merge_pending(store, player, PlayerSerializer(player).data, pending)
+    return tag_response(JsonResponse(data), etag)
+
+
+@require_POST
+@api_login_required
+async def sync_player_state(request, user):
+    """
+    Sync client state with server
+    """
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Malformed request body'}, status=400)
+    try:
+        payload = parse_sync(data)
+    except PayloadError as e:
+        return JsonResponse(e.errors, status=400)
+
+    try:
+        player = await Player.objects.aget(user=user)
+    except Player.DoesNotExist:
+        return JsonResponse({'error': 'Player profile not found'}, status=404)
+
+    # Clicks still sitting in the click buffer are part of the current state
+    store = get_store()
+    pending_energy, pending_balance = await pending_deltas(store, player)
+
+    energy = payload.energy
+    if energy is None:
+        energy = player.get_current_energy() - pending_energy
+    balance = payload.balance
+    if balance is None:
+        balance = player.balance + pending_balance
+
+    # Validate energy (can't exceed max_energy)
+    energy = min(energy, player.max_energy)
+
+    old_balance = player.balance
+    player.energy = energy + pending_energy
+    player.balance = balance - pending_balance
+    player.last_energy_update = timezone.now()
+    await player.asave(update_fields=['energy', 'balance', 'last_energy_update'] + player.bump_version())
+    await sync_to_async(complete_tasks)([(player.pk, 'balance', old_balance, player.balance)])
+
+    data = PlayerSerializer(player).data
+    if store is not None:
+        data = await sync_to_async(merge_pending)(store, player, data)
+    return JsonResponse(data)
+
+
+@require_POST
+@api_login_required
+async def process_click(request, user):
+    """
+    Process a click action
+    """
+    data = parse_body(request)
+    if data is None:
+        return JsonResponse({'error': 'Malformed request body'}, status=400)
+
+    try:
+        payload = parse_click(data)
+    except PayloadError as e:
+        return JsonResponse(e.errors, status=400)
+
+    player_cache = get_player_cache()
+    player = await player_cache.aget(user.id)
+    if player is None:
+        return JsonResponse({'error': 'Player profile not found'}, status=404)
+
+    clicks = payload.clicks
+    timestamp = payload.timestamp
+
+    # Validate timestamp (should be recent)
+    time_diff = abs((timezone.now() - timestamp).total_seconds())
+    if time_diff > 30:  # More than 30 seconds old
+        return JsonResponse({'error': 'Invalid timestamp'}, status=400)
+
+    result = await sync_to_async(apply_clicks)(player, clicks, client_ts=timestamp)
+    if result is None:
+        return JsonResponse({'error': 'Not enough energy'}, status=400)
+
+    balance, energy, max_energy = result
+    return JsonResponse({
+        'balance': balance,
+        'energy': energy,
+        'max_energy': max_energy
+    })
@@ -0,0 +1,356 @@
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import parse_qsl
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .models import Player
+
+
+DEFAULTS = {
+    'TTL': 7 * 24 * 60 * 60,  # Seconds a token stays valid
+    'CACHE': 'default',  # CACHES alias holding the denylist
+    'KEYWORD': 'Player',  # Authorization: Player <token>
+    'REFRESH_BEFORE': 24 * 60 * 60,  # Seconds before expiry a session token is reissued
+}
+
+SALT = 'clicker_app.player_token'
+SESSION_KEY = 'player_token'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_PLAYER_TOKEN', {})}
+
+
+def _millis(now=None):
+    return int((now if now is not None else time.time()) * 1000)
+
+
+PlayerToken = namedtuple('PlayerToken', ['user_id', 'player_id', 'issued_at', 'expires_at', 'token_id'])
+
+
+def issue_player_token(user, player_id=None, now=None):
+    """
+    Return a signed token for ``user`` and its decoded PlayerToken.
+
+    The token is "<user id>.<player id>.<issued>.<expires>.<token id>"
+    (times in unix milliseconds) signed with HMAC-SHA256 over SECRET_KEY,
+    so it can be verified without touching the database.
+    """
+    if player_id is None:
+        player_id = Player.objects.values_list('pk', flat=True).get(user=user)
+    issued_at = _millis(now)
+    payload = PlayerToken(
+        user.pk, player_id, issued_at, issued_at + get_config()['TTL'] * 1000, secrets.token_urlsafe(8)
+    )
+    value = '.'.join(str(part) for part in payload)
+    return signing.Signer(salt=SALT).sign(value), payload
+
+
+def _decode(token):
+    try:
+        value = signing.Signer(salt=SALT).unsign(token)
+        user_id, player_id, issued_at, expires_at, token_id = value.split('.')
+        return PlayerToken(int(user_id), int(player_id), int(issued_at), int(expires_at), token_id)
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+def _denylist_keys(payload):
+    return f'clicker:token_denied:{payload.token_id}', f'clicker:token_revoked_before:{payload.user_id}'
+
+
+def verify_player_token(token, now=None):
+    """
+    Return the PlayerToken for a valid token or raise AuthenticationFailed.
+    Costs one denylist cache lookup and no database queries.
+    """
+    payload = _decode(token)
+    if payload is None:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+    if payload.expires_at <= _millis(now):
+        raise exceptions.AuthenticationFailed('Token has expired.')
+
+    denied_key, revoked_key = _denylist_keys(payload)
+    denylist = caches[get_config()['CACHE']].get_many([denied_key, revoked_key])
+    if denied_key in denylist or payload.issued_at < denylist.get(revoked_key, 0):
+        raise exceptions.AuthenticationFailed('Token has been revoked.')
+    return payload
+
+
+def revoke_player_token(payload, now=None):
+    """Deny one token until it would have expired anyway"""
+    denied_key, _ = _denylist_keys(payload)
+    timeout = max((payload.expires_at - _millis(now)) // 1000 + 1, 1)
+    caches[get_config()['CACHE']].set(denied_key, True, timeout=timeout)
+
+
+def revoke_player_tokens(user_id, now=None):
+    """
+    Deny every token of a user issued before now (rotation after a
+    password change or a lost device)
+    """
+    _, revoked_key = _denylist_keys(PlayerToken(user_id, None, None, None, None))
+    caches[get_config()['CACHE']].set(revoked_key, _millis(now), timeout=get_config()['TTL'])
+
+
+def session_player_token(request, now=None):
+    """
+    Return the player token kept in the session of a logged-in user,
+    reissuing it when it is missing, revoked or expires within
+    REFRESH_BEFORE, so pages never hand out a token the API will reject.
+    Returns '' for anonymous users and users without a player.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated or not hasattr(request, 'session'):
+        return ''
+
+    token = request.session.get(SESSION_KEY)
+    if token:
+        try:
+            payload = verify_player_token(token, now)
+        except exceptions.AuthenticationFailed:
+            pass
+        else:
+            if payload.expires_at - _millis(now) > get_config()['REFRESH_BEFORE'] * 1000:
+                return token
+
+    try:
+        token = issue_player_token(user, now=now)[0]
+    except Player.DoesNotExist:
+        request.session.pop(SESSION_KEY, None)
+        return ''
+    request.session[SESSION_KEY] = token
+    return token
+
+
+def user_stand_in(user_id):
+    """
+    An unloaded stand-in for an authenticated user, so authentication does
+    not load auth_user. Accessing ``.player`` loads the player by user id.
+    """
+    user = User(pk=user_id, is_active=True)
+    user._state.adding = False
+    return user
+
+
+class PlayerTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate with a signed player token:
+
+        Authorization: Player <token>
+
+    request.user is an unsaved User carrying only the id and request.auth
+    the PlayerToken (with player_id), so no queries are made.
+    """
+
+    def authenticate(self, request):
+        keyword = get_config()['KEYWORD']
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        try:
+            token = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        payload = verify_player_token(token)
+        return user_stand_in(payload.user_id), payload
+
+    def authenticate_header(self, request):
+        return get_config()['KEYWORD']
+
+
+TELEGRAM_DEFAULTS = {
+    'BOT_TOKEN': '',  # Telegram authentication is disabled without it
+    'MAX_AGE': 24 * 60 * 60,  # Seconds an initData payload stays valid
+    'CACHE_SIZE': 100000,  # telegram_id -> player entries kept per worker
+}
+
+
+def get_telegram_config():
+    return {**TELEGRAM_DEFAULTS, **getattr(settings, 'CLICKER_TELEGRAM', {})}
+
+
+TelegramAuth = namedtuple('TelegramAuth', ['telegram_id', 'user_id', 'player_id', 'auth_date', 'user'])
+
+
+def verify_init_data(init_data, bot_token, max_age, now=None):
+    """
+    Check the signature of a Telegram WebApp initData string and return
+    (auth_date, user dict), or raise AuthenticationFailed.
+
+    The hash is HMAC-SHA256 of the sorted "key=value" lines with a key of
+    HMAC-SHA256("WebAppData", bot token), so no call to Telegram is needed.
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop('hash', '')
+    data_check_string = '\n'.join(f'{key}={fields[key]}' for key in sorted(fields))
+    secret_key = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received):
+        raise exceptions.AuthenticationFailed('Invalid Telegram init data.')
+
+    try:
+        auth_date = int(fields['auth_date'])
+        user = json.loads(fields['user'])
+        int(user['id'])
+    except (KeyError, TypeError, ValueError):
+        raise exceptions.AuthenticationFailed('Invalid Telegram init data.')
+    if auth_date + max_age < (now if now is not None else time.time()):
+        raise exceptions.AuthenticationFailed('Telegram init data has expired.')
+    return auth_date, user
+
+
+class TelegramPlayerIndex:
+    """
+    Per-worker LRU map of telegram_id -> (user id, player id). Telegram ids
+    never move to another player, so entries only leave on eviction or
+    when the player is deleted.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, telegram_id):
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is not None:
+                self._entries.move_to_end(telegram_id)
+            return entry
+
+    def set(self, telegram_id, user_id, player_id):
+        with self._lock:
+            self._entries[telegram_id] = (user_id, player_id)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, telegram_id):
+        with self._lock:
+            self._entries.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_telegram_index = None
+_telegram_index_lock = threading.Lock()
+
+
+def get_telegram_index():
+    global _telegram_index
+    with _telegram_index_lock:
+        if _telegram_index is None:
+            _telegram_index = TelegramPlayerIndex(get_telegram_config()['CACHE_SIZE'])
+    return _telegram_index
+
+
+def reset_telegram_index():
+    """Drop the index instance, e.g. after settings change in tests"""
+    global _telegram_index
+    with _telegram_index_lock:
+        _telegram_index = None
+
+
+def resolve_telegram_player(telegram_id, telegram_user, retries=3):
+    """
+    Return (user id, player id) for a Telegram user, creating the User and
+    Player together on first sight. Raises AuthenticationFailed if the
+    player cannot be created.
+    """
+    index = get_telegram_index()
+    entry = index.get(telegram_id)
+    if entry is not None:
+        return entry
+
+    for _ in range(retries):
+        entry = Player.objects.filter(telegram_id=telegram_id).values_list('user_id', 'pk').first()
+        if entry is not None:
+            break
+        try:
+            entry = _create_telegram_player(telegram_id, telegram_user)
+            break
+        except IntegrityError:
+            # Another request created the player or took the username first
+            continue
+    else:
+        raise exceptions.AuthenticationFailed('Could not create a player for this Telegram user.')
+
+    index.set(telegram_id, *entry)
+    return entry
+
+
+def _telegram_field(telegram_user, name):
+    """A string field of a Telegram user, '' when missing or not a string"""
+    value = telegram_user.get(name)
+    return value[:150] if isinstance(value, str) else ''
+
+
+def _create_telegram_player(telegram_id, telegram_user):
+    # Someone may have registered tg_<id> already: fall back to a suffix
+    username = f'tg_{telegram_id}'
+    if User.objects.filter(username=username).exists():
+        username = f'{username}_{secrets.token_hex(4)}'
+    with transaction.atomic():
+        user = User(username=username, first_name=_telegram_field(telegram_user, 'first_name'))
+        user.set_unusable_password()
+        # The player is created right below, with its Telegram fields
+        user._skip_player_profile = True
+        user.save()
+        player = Player.objects.create(
+            user=user, telegram_id=telegram_id, username=_telegram_field(telegram_user, 'username')
+        )
+    return user.pk, player.pk
+
+
+class TelegramInitDataAuthentication(BaseAuthentication):
+    """
+    Authenticate Telegram WebApp users with the signed initData string:
+
+        Authorization: tma <initData>
+
+    Signatures are checked locally and the Telegram id is resolved to a
+    player through a per-worker index, so warm requests make no queries.
+    request.auth is a TelegramAuth.
+    """
+    keyword = 'tma'
+
+    def authenticate(self, request):
+        config = get_telegram_config()
+        auth = get_authorization_header(request).split(maxsplit=1)
+        if not auth or auth[0].lower() != self.keyword.encode() or not config['BOT_TOKEN']:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid Telegram init data.')
+
+        try:
+            init_data = auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid Telegram init data.')
+
+        auth_date, telegram_user = verify_init_data(init_data, config['BOT_TOKEN'], config['MAX_AGE'])
+        telegram_id = int(telegram_user['id'])
+        user_id, player_id = resolve_telegram_player(telegram_id, telegram_user)
+
+        return user_stand_in(user_id), TelegramAuth(telegram_id, user_id, player_id, auth_date, telegram_user)
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,167 @@
+import threading
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .conditional import fingerprint
+from .models import DailyReward, Task, Upgrade
+from .renderers import FastJSONRenderer
+from .serializers import DailyRewardSerializer, TaskSerializer, UpgradeSerializer
+
+
+# The upgrade, task and daily reward catalogs change only when an admin
+# edits them, yet every list endpoint used to read and serialize them per
+# request. Each worker keeps one immutable snapshot of all three, built
+# with three queries and pre-serialized once. Saving or deleting a catalog
+# row bumps a version stamp in a shared cache after the transaction
+# commits; workers compare their snapshot's version with it at most every
+# CHECK_INTERVAL seconds and rebuild when it moved.
+
+DEFAULTS = {
+    # Django cache alias holding the catalog version stamp shared by all
+    # processes; None keeps invalidation per-worker
+    'SHARED_CACHE': 'default',
+    'CHECK_INTERVAL': 1.0,  # Seconds between reads of the shared stamp
+}
+
+VERSION_KEY = 'clicker:catalog_version'
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_CATALOG', {})}
+
+
+def _render(data):
+    return FastJSONRenderer().render(data)
+
+
+class ThresholdIndex:
+    """
+    Tasks of one type sorted by target_value (then order), so the targets a
+    counter passed on its way from one value to another are found with two
+    binary searches however many tasks there are
+    """
+
+    __slots__ = ('tasks', 'targets')
+
+    def __init__(self, tasks):
+        self.tasks = tuple(sorted(tasks, key=lambda task: (task.target_value, task.order, task.pk)))
+        self.targets = [task.target_value for task in self.tasks]
+
+    def crossed(self, old, new):
+        """Tasks whose target lies in (old, new]"""
+        if new <= old:
+            return ()
+        return self.tasks[bisect_right(self.targets, old):bisect_right(self.targets, new)]
+
+    def reached(self, value):
+        """Tasks whose target is at most ``value``"""
+        return self.tasks[:bisect_right(self.targets, value)]
+
+
+class Catalog:
+    """
+    Snapshot of the active upgrades, active tasks and daily rewards, with
+    lookups by id (by day for rewards), their serialized forms and content
+    fingerprints for ETags, which agree across workers holding the same
+    rows. The model instances are shared between requests and must not be
+    modified.
+    """
+
+    def __init__(self, version):
+        self.version = version
+        self.built_at = time.time()
+
+        self.upgrades = tuple(Upgrade.objects.filter(is_active=True))
+        self.upgrades_by_id = {upgrade.pk: upgrade for upgrade in self.upgrades}
+        self.upgrades_data = [dict(item) for item in UpgradeSerializer(self.upgrades, many=True).data]
+        self.upgrades_json = _render(self.upgrades_data)
+        self.upgrades_fingerprint = fingerprint(self.upgrades_json)
+
+        self.tasks = tuple(Task.objects.filter(is_active=True))
+        self.tasks_by_id = {task.pk: task for task in self.tasks}
+        self.tasks_by_slot = {task.slot: task for task in self.tasks}
+        by_type = {}
+        for task in self.tasks:
+            by_type.setdefault(task.task_type, []).append(task)
+        self.task_thresholds = {task_type: ThresholdIndex(tasks) for task_type, tasks in by_type.items()}
+        self.tasks_data = {task.pk: dict(TaskSerializer(task).data) for task in self.tasks}
+        self.tasks_fingerprint = fingerprint(_render(list(self.tasks_data.values())))
+
+        self.daily_rewards = tuple(DailyReward.objects.order_by('day'))
+        self.daily_rewards_by_day = {reward.day: reward for reward in self.daily_rewards}
+        self.daily_rewards_data = [
+            dict(item) for item in DailyRewardSerializer(self.daily_rewards, many=True).data
+        ]
+        self.daily_rewards_json = _render(self.daily_rewards_data)
+        self.daily_rewards_fingerprint = fingerprint(self.daily_rewards_json)
+
+
+_catalog = None
+_checked_at = 0.0
+_catalog_lock = threading.Lock()
+
+
+def _shared():
+    alias = get_config()['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def catalog_version():
+    """The current shared catalog version stamp (0 without a shared cache)"""
+    shared = _shared()
+    return shared.get(VERSION_KEY, 0) if shared is not None else 0
+
+
+def get_catalog():
+    """
+    Return this worker's catalog snapshot, rebuilding it when it was
+    invalidated here or another process bumped the shared stamp
+    """
+    global _catalog, _checked_at
+    catalog = _catalog
+    now = time.monotonic()
+    if catalog is not None and now - _checked_at < get_config()['CHECK_INTERVAL']:
+        return catalog
+
+    # Read the stamp before the rows: a bump racing the build only makes
+    # the next check rebuild again
+    version = catalog_version()
+    if catalog is None or catalog.version != version:
+        catalog = Catalog(version)
+    with _catalog_lock:
+        _catalog, _checked_at = catalog, now
+    return catalog
+
+
+def reset_catalog():
+    """Drop this worker's snapshot so the next read rebuilds it"""
+    global _catalog
+    with _catalog_lock:
+        _catalog = None
+
+
+def _publish():
+    reset_catalog()
+    shared = _shared()
+    if shared is None:
+        return
+    try:
+        shared.incr(VERSION_KEY)
+    except ValueError:
+        # First edit since the stamp expired or was never set
+        shared.add(VERSION_KEY, 0, timeout=None)
+        shared.incr(VERSION_KEY)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every worker's catalog. The local snapshot goes at once and
+    again once the current transaction commits, when the shared stamp
+    moves too, so nobody keeps a snapshot of rows from before the commit.
+    """
+    reset_catalog()
+    transaction.on_commit(_publish)
@@ -0,0 +1,436 @@
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import BigIntegerField, Case, DateTimeField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .energy import regenerated_energy, regenerated_snapshot
+from .models import Player, PlayerCounterShard
+from .player_cache import get_player_cache
+from .task_progress import complete_tasks
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'BACKEND': 'redis',
+    'REDIS_URL': 'redis://127.0.0.1:6379/1',
+    'KEY': 'clicker:click_buffer',
+    'BATCH_SIZE': 500,
+    'SHARDS': 8,
+    # Seconds a Redis flush lock is held at most; keep it well above the
+    # longest flush, or an overlapping flush could apply the same deltas
+    'FLUSH_LOCK_TIMEOUT': 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_CLICK_BUFFER', {})}
+
+
+class InMemoryClickStore:
+    """
+    Process-local pending deltas, for tests and single-process setups
+    """
+    in_database = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._flushing = {}
+        self._spent_at = {}
+        self._flushing_spent_at = {}
+
+    @contextmanager
+    def flushing(self):
+        """Hold the flush lock; yields False if another flush holds it"""
+        acquired = self._flush_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._flush_lock.release()
+
+    def add(self, player_id, energy, balance, now=None):
+        """Add deltas for a player and return the new pending totals"""
+        with self._lock:
+            spent, earned = self._pending.get(player_id, (0, 0))
+            self._pending[player_id] = (spent + energy, earned + balance)
+            if energy > 0:
+                self._spent_at.setdefault(player_id, now or timezone.now())
+            return self._merged(player_id)
+
+    def pending(self, player_id):
+        with self._lock:
+            return self._merged(player_id)
+
+    def drain(self):
+        """Hand over every pending delta for flushing"""
+        with self._lock:
+            if not self._flushing:
+                self._flushing, self._pending = self._pending, {}
+                self._flushing_spent_at, self._spent_at = self._spent_at, {}
+            return dict(self._flushing)
+
+    def spent_at(self):
+        """Earliest spend time of each drained player's deltas"""
+        with self._lock:
+            return dict(self._flushing_spent_at)
+
+    def ack(self):
+        """Forget the drained deltas once they are committed"""
+        with self._lock:
+            self._flushing = {}
+            self._flushing_spent_at = {}
+
+    def _merged(self, player_id):
+        spent, earned = self._pending.get(player_id, (0, 0))
+        flushing_spent, flushing_earned = self._flushing.get(player_id, (0, 0))
+        return spent + flushing_spent, earned + flushing_earned
+
+
+class RedisClickStore:
+    """
+    Pending deltas shared by every web worker through a Redis hash.
+
+    Each player has an "<id>:e" (energy spent) and "<id>:b" (coins earned)
+    field, plus "<id>:t" holding the epoch time of the first spend. Draining renames the hash so new clicks land in a fresh one while
+    the old one is written to Postgres; a drained hash is kept until ack()
+    so a failed flush is retried instead of losing clicks. Flushes take a
+    Redis lock (SET NX PX) so only one drains, applies and acks at a time.
+    """
+    in_database = False
+
+    def __init__(self, url, key, lock_timeout=60):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.key = key
+        self.flushing_key = f'{key}:flushing'
+        self.lock_timeout = lock_timeout
+        self._spent_at = {}
+
+    @contextmanager
+    def flushing(self):
+        from redis.exceptions import LockError
+
+        lock = self.client.lock(f'{self.key}:lock', timeout=self.lock_timeout, blocking=False)
+        acquired = lock.acquire()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except LockError:
+                    # Held past lock_timeout; another flush may own it now
+                    pass
+
+    def add(self, player_id, energy, balance, now=None):
+        pipe = self.client.pipeline()
+        if energy > 0:
+            pipe.hsetnx(self.key, f'{player_id}:t', (now or timezone.now()).timestamp())
+        pipe.hincrby(self.key, f'{player_id}:e', energy)
+        pipe.hincrby(self.key, f'{player_id}:b', balance)
+        pipe.hmget(self.flushing_key, f'{player_id}:e', f'{player_id}:b')
+        spent, earned, flushing = pipe.execute()[-3:]
+        return spent + int(flushing[0] or 0), earned + int(flushing[1] or 0)
+
+    def pending(self, player_id):
+        fields = (f'{player_id}:e', f'{player_id}:b')
+        pipe = self.client.pipeline()
+        pipe.hmget(self.key, *fields)
+        pipe.hmget(self.flushing_key, *fields)
+        current, flushing = pipe.execute()
+        return (
+            int(current[0] or 0) + int(flushing[0] or 0),
+            int(current[1] or 0) + int(flushing[1] or 0),
+        )
+
+    def drain(self):
+        from redis.exceptions import ResponseError
+
+        try:
+            # Never overwrite a drained hash a failed flush left behind
+            self.client.renamenx(self.key, self.flushing_key)
+        except ResponseError:
+            # Nothing has been buffered since the last flush
+            pass
+
+        deltas = {}
+        self._spent_at = {}
+        for field, value in self.client.hgetall(self.flushing_key).items():
+            player_id, kind = field.decode().split(':')
+            if kind == 't':
+                self._spent_at[int(player_id)] = datetime.fromtimestamp(float(value), dt_timezone.utc)
+                continue
+            spent, earned = deltas.get(int(player_id), (0, 0))
+            if kind == 'e':
+                spent += int(value)
+            else:
+                earned += int(value)
+            deltas[int(player_id)] = (spent, earned)
+        return deltas
+
+    def spent_at(self):
+        return dict(self._spent_at)
+
+    def ack(self):
+        self.client.delete(self.flushing_key)
+        self._spent_at = {}
+
+
+class ShardedCounterStore:
+    """
+    Pending deltas kept in the database as PlayerCounterShard rows.
+
+    Every add goes to one of SHARDS rows of the player picked at random, so
+    concurrent clicks of one player rarely wait on the same row lock, and
+    reads sum the player's shards. Draining locks and remembers each
+    shard's value; ack() subtracts exactly those values, inside the same
+    transaction that folds them into Player, so adds made meanwhile are
+    kept. Shards locked by an overlapping flush in another process are
+    skipped, so no shard is folded in twice.
+    """
+    in_database = True
+
+    def __init__(self, shards):
+        self.shards = shards
+        self._drained = {}
+        self._spent_at = {}
+        self._flush_lock = threading.Lock()
+
+    @contextmanager
+    def flushing(self):
+        # Row locks keep processes apart; this keeps this instance's
+        # drained values to one flush at a time
+        acquired = self._flush_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                self._flush_lock.release()
+
+    def add(self, player_id, energy, balance, now=None):
+        shard = random.randrange(self.shards)
+        spent_at = (now or timezone.now()) if energy > 0 else None
+        if not self._increment(player_id, shard, energy, balance, spent_at):
+            try:
+                with transaction.atomic():
+                    PlayerCounterShard.objects.create(
+                        player_id=player_id, shard=shard, energy=energy, balance=balance,
+                        spent_at=spent_at
+                    )
+            except IntegrityError:
+                # Another click created the shard first
+                self._increment(player_id, shard, energy, balance, spent_at)
+        return self.pending(player_id)
+
+    def pending(self, player_id):
+        totals = PlayerCounterShard.objects.filter(player_id=player_id).aggregate(
+            energy=Sum('energy'), balance=Sum('balance')
+        )
+        return totals['energy'] or 0, totals['balance'] or 0
+
+    def drain(self):
+        """Must run in the transaction that applies and acks the deltas"""
+        rows = PlayerCounterShard.objects.select_for_update(skip_locked=True).exclude(
+            energy=0, balance=0
+        ).values_list('pk', 'player_id', 'energy', 'balance', 'spent_at')
+        self._drained = {}
+        self._spent_at = {}
+        deltas = {}
+        for pk, player_id, energy, balance, spent_at in rows:
+            self._drained[pk] = (energy, balance)
+            spent, earned = deltas.get(player_id, (0, 0))
+            deltas[player_id] = (spent + energy, earned + balance)
+            if spent_at is not None:
+                self._spent_at[player_id] = min(spent_at, self._spent_at.get(player_id, spent_at))
+        return deltas
+
+    def spent_at(self):
+        return dict(self._spent_at)
+
+    def ack(self):
+        items = sorted(self._drained.items())
+        batch_size = get_config()['BATCH_SIZE']
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            PlayerCounterShard.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                energy=F('energy') - _case(batch, 0, BigIntegerField()),
+                balance=F('balance') - _case(batch, 1, BigIntegerField()),
+                # Nothing spent before the drain is left in the shard
+                spent_at=None,
+            )
+        self._drained = {}
+        self._spent_at = {}
+
+    def _increment(self, player_id, shard, energy, balance, spent_at):
+        fields = {'energy': F('energy') + energy, 'balance': F('balance') + balance}
+        if spent_at is not None:
+            fields['spent_at'] = Coalesce(F('spent_at'), Value(spent_at))
+        return PlayerCounterShard.objects.filter(player_id=player_id, shard=shard).update(**fields)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """
+    Return the configured click store, or None when buffering is disabled
+    """
+    global _store
+    config = get_config()
+    if not config['ENABLED']:
+        return None
+
+    with _store_lock:
+        if _store is None:
+            if config['BACKEND'] == 'memory':
+                _store = InMemoryClickStore()
+            elif config['BACKEND'] == 'shards':
+                _store = ShardedCounterStore(config['SHARDS'])
+            else:
+                _store = RedisClickStore(config['REDIS_URL'], config['KEY'], config['FLUSH_LOCK_TIMEOUT'])
+    return _store
+
+
+def reset_store():
+    """Drop the cached store, e.g. after settings change in tests"""
+    global _store
+    with _store_lock:
+        _store = None
+
+
+# Player columns the buffered energy check reads
+ENERGY_FIELDS = ['balance', 'energy', 'max_energy', 'energy_regen_rate', 'last_energy_update']
+
+
+def buffer_clicks(store, player, clicks, now=None):
+    """
+    Record clicks as pending deltas instead of writing the player row.
+
+    The energy check runs against the player's regenerated energy minus
+    everything still pending, and is made safe under concurrency by adding
+    first and rolling back if the pending total overshoots. Returns the
+    merged (balance, energy) or None if there is not enough energy.
+
+    The energy is read from the Player row, not from ``player``: another
+    process may have flushed the pending deltas into the row since the
+    state was cached, and a cached state with emptied pending totals would
+    let the same energy be spent twice. The row is read after the add,
+    while a flush commits before it forgets the deltas, so a racing flush
+    can only make the check count a delta twice, never miss it.
+    """
+    earned = clicks * player.coins_per_click
+
+    pending_energy, pending_balance = store.add(player.pk, clicks, earned, now)
+    balance, *energy_state = Player.objects.values_list(*ENERGY_FIELDS).get(pk=player.pk)
+    energy = regenerated_energy(*energy_state, now)
+    if energy - pending_energy < 0:
+        store.add(player.pk, -clicks, -earned)
+        return None
+    return balance + pending_balance, energy - pending_energy
+
+
+def merge_pending(store, player, data, pending=None):
+    """
+    Apply a player's pending deltas to serialized player data; ``pending``
+    passes (energy, balance) deltas the caller already read
+    """
+    if store is None:
+        return data
+    pending_energy, pending_balance = pending or store.pending(player.pk)
+    data['balance'] = data['balance'] + pending_balance
+    data['energy'] = data['energy'] - pending_energy
+    return data
+
+
+def _case(deltas, index, output_field, default=Value(0)):
+    return Case(
+        *[When(pk=player_id, then=Value(delta[index])) for player_id, delta in deltas],
+        default=default,
+        output_field=output_field,
+    )
+
+
+def flush_click_buffer(store=None, now=None):
+    """
+    Write all pending deltas to the Player table.
+
+    Deltas are applied in batches of BATCH_SIZE players, one locking read
+    and one UPDATE per batch. The spent energy is subtracted at the time of
+    the player's first buffered spend and the rest regenerated up to the
+    flush, so a bar that was full when clicked keeps the energy it won back
+    while the deltas waited. Only one flush runs at a time: a flush started
+    while another holds the store's flush lock does nothing. Returns the
+    number of players updated.
+    """
+    store = store or get_store()
+    if store is None:
+        return 0
+
+    with store.flushing() as acquired:
+        if not acquired:
+            return 0
+        return _flush(store, now)
+
+
+def _flush(store, now):
+    now = now or timezone.now()
+    batch_size = get_config()['BATCH_SIZE']
+
+    updated = 0
+    with transaction.atomic():
+        # Database-backed stores lock the drained rows until the commit
+        deltas = store.drain()
+        spent_at = store.spent_at()
+        items = sorted(deltas.items())
+        for start in range(0, len(items), batch_size):
+            batch = items[start:start + batch_size]
+            players = Player.objects.select_for_update().filter(pk__in=[player_id for player_id, _ in batch])
+            snapshots = []
+            for player_id, energy, max_energy, regen_rate, last_update in players.values_list(
+                'pk', 'energy', 'max_energy', 'energy_regen_rate', 'last_energy_update'
+            ):
+                spent = deltas[player_id][0]
+                energy, last_update = regenerated_snapshot(
+                    energy, max_energy, regen_rate, last_update, min(spent_at.get(player_id, now), now)
+                )
+                snapshots.append((player_id, regenerated_snapshot(
+                    energy - spent, max_energy, regen_rate, last_update, now
+                )))
+            updated += players.update(
+                energy=_case(snapshots, 0, IntegerField(), default=F('energy')),
+                balance=F('balance') + _case(batch, 1, BigIntegerField()),
+                # Every buffered click spent one energy
+                total_clicks=F('total_clicks') + _case(batch, 0, BigIntegerField()),
+                last_energy_update=_case(snapshots, 1, DateTimeField(), default=F('last_energy_update')),
+                version=F('version') + 1,
+            )
+        if store.in_database:
+            # Counter shards are emptied in the same transaction they are folded in
+            store.ack()
+    if not store.in_database:
+        store.ack()
+    if not deltas:
+        return 0
+
+    # Cached player states still hold the pre-flush balance
+    rows = list(Player.objects.filter(pk__in=deltas).values_list('pk', 'user_id', 'total_clicks', 'balance'))
+    get_player_cache().invalidate_many([user_id for _, user_id, _, _ in rows])
+
+    # Report the flushed clicks as task progress in one batch
+    events = []
+    for player_id, _, total_clicks, balance in rows:
+        clicks, earned = deltas[player_id]
+        events.append((player_id, 'clicks', total_clicks - clicks, total_clicks))
+        events.append((player_id, 'balance', balance - earned, balance))
+    complete_tasks(events)
+    return updated
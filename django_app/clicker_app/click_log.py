@@ -0,0 +1,262 @@
+import atexit
+import io
+import logging
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import ClickEvent
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BATCH_SIZE': 1000,  # Buffered events that trigger a flush
+    'FLUSH_INTERVAL': 1.0,  # Seconds an event may wait for a flush
+    'MAX_BUFFERED': 100000,  # Events kept per worker while the database is unavailable
+    'RETENTION_DAYS': 30,
+    'PARTITIONS_AHEAD': 3,  # Daily partitions created in advance
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_CLICK_LOG', {})}
+
+
+class EventBuffer:
+    """
+    Process-local queue of event rows waiting to be written. Rows are
+    appended on the request path and written in batches once BATCH_SIZE
+    rows or FLUSH_INTERVAL seconds have piled up.
+    """
+
+    def __init__(self, batch_size, flush_interval, max_buffered):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._rows = []
+        self._oldest = None
+
+    def append(self, row):
+        with self._lock:
+            if len(self._rows) >= self.max_buffered:
+                self.dropped += 1
+                return
+            if not self._rows:
+                self._oldest = time.monotonic()
+            self._rows.append(row)
+
+    def due(self):
+        """Whether enough events, or old enough ones, are waiting"""
+        with self._lock:
+            return bool(self._rows) and (
+                len(self._rows) >= self.batch_size
+                or time.monotonic() - self._oldest >= self.flush_interval
+            )
+
+    def drain(self):
+        with self._lock:
+            rows, self._rows, self._oldest = self._rows, [], None
+            return rows
+
+    def requeue(self, rows):
+        """Put back events whose write failed, oldest first"""
+        with self._lock:
+            keep = max(self.max_buffered - len(self._rows), 0)
+            self.dropped += max(len(rows) - keep, 0)
+            self._rows = rows[:keep] + self._rows
+            if self._rows:
+                self._oldest = time.monotonic()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rows)
+
+
+class ClickEventBuffer(EventBuffer):
+    """Queue of click events, see EventBuffer"""
+
+    def record(self, player_id, count, server_ts, client_ts=None, sequence=None):
+        self.append((player_id, count, server_ts, client_ts, sequence))
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_click_log():
+    """Return the configured event buffer, or None if the log is disabled"""
+    global _buffer
+    config = get_config()
+    if not config['ENABLED']:
+        return None
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = ClickEventBuffer(
+                config['BATCH_SIZE'], config['FLUSH_INTERVAL'], config['MAX_BUFFERED']
+            )
+            atexit.register(flush_click_log, _buffer, force=True)
+    return _buffer
+
+
+def reset_click_log():
+    """Drop the buffer instance, e.g. after settings change in tests"""
+    global _buffer
+    with _buffer_lock:
+        _buffer = None
+    _partitions.clear()
+
+
+def record_clicks(player_id, count, client_ts=None, sequence=None, now=None):
+    """Queue a click event; a no-op when the log is disabled"""
+    log = get_click_log()
+    if log is not None:
+        log.record(player_id, count, now or timezone.now(), client_ts, sequence)
+
+
+def flush_click_log(log=None, force=False):
+    """
+    Write the buffered events if a flush is due (or ``force``), and return
+    how many were written. Events of a failed write are put back.
+    """
+    log = log or get_click_log()
+    if log is None or not (force or log.due()):
+        return 0
+
+    rows = log.drain()
+    if not rows:
+        return 0
+    try:
+        write_click_events(rows)
+    except Exception:
+        logger.exception('Could not write %d click events', len(rows))
+        log.requeue(rows)
+        return 0
+    return len(rows)
+
+
+def write_click_events(rows):
+    """
+    Write (player_id, count, server_ts, client_ts, sequence) rows: with
+    COPY on PostgreSQL, with a bulk INSERT elsewhere
+    """
+    if connection.vendor != 'postgresql':
+        ClickEvent.objects.bulk_create([
+            ClickEvent(player_id=player_id, count=count, server_ts=server_ts,
+                       client_ts=client_ts, sequence=sequence)
+            for player_id, count, server_ts, client_ts, sequence in rows
+        ])
+        return
+
+    ensure_partitions({_day(server_ts) for _, _, server_ts, _, _ in rows})
+
+    data = io.StringIO()
+    for row in rows:
+        data.write('\t'.join(_copy_value(value) for value in row))
+        data.write('\n')
+    data.seek(0)
+
+    table = connection.ops.quote_name(ClickEvent._meta.db_table)
+    sql = f'COPY {table} (player_id, count, server_ts, client_ts, sequence) FROM STDIN'
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, 'copy_expert'):
+            cursor.cursor.copy_expert(sql, data)  # psycopg2
+        else:
+            with cursor.cursor.copy(sql) as copy:  # psycopg 3
+                copy.write(data.getvalue())
+
+
+def _copy_value(value):
+    """Format a value for COPY's text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+# Partition maintenance (PostgreSQL only)
+
+_partitions = set()
+
+
+def _day(value):
+    return value.astimezone(dt_timezone.utc).date()
+
+
+def partition_name(day):
+    return f'{ClickEvent._meta.db_table}_p{day:%Y%m%d}'
+
+
+def ensure_partitions(days):
+    """Create the daily partitions for ``days`` unless this worker already did"""
+    missing = sorted(day for day in days if day not in _partitions)
+    if not missing:
+        return
+
+    table = connection.ops.quote_name(ClickEvent._meta.db_table)
+    with connection.cursor() as cursor:
+        for day in missing:
+            start = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {connection.ops.quote_name(partition_name(day))} '
+                f"PARTITION OF {table} FOR VALUES FROM ('{start.isoformat()}') "
+                f"TO ('{(start + timedelta(days=1)).isoformat()}')"
+            )
+    _partitions.update(missing)
+
+
+def drop_expired_click_events(retention_days=None, now=None):
+    """
+    Remove events older than ``retention_days``. On PostgreSQL whole daily
+    partitions are dropped, without scanning or deleting rows; other
+    databases fall back to a DELETE. Returns the partitions (or rows)
+    removed.
+    """
+    retention_days = retention_days if retention_days is not None else get_config()['RETENTION_DAYS']
+    cutoff = _day(now or timezone.now()) - timedelta(days=retention_days)
+
+    if connection.vendor != 'postgresql':
+        start = datetime.combine(cutoff, dt_time.min, tzinfo=dt_timezone.utc)
+        deleted, _ = ClickEvent.objects.filter(server_ts__lt=start).delete()
+        return deleted
+
+    prefix = partition_name(cutoff)[:-8]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [ClickEvent._meta.db_table]
+        )
+        names = [name for name, in cursor.fetchall()]
+
+        dropped = 0
+        for name in names:
+            try:
+                day = datetime.strptime(name[len(prefix):], '%Y%m%d').date()
+            except ValueError:
+                continue
+            if day < cutoff:
+                cursor.execute(f'DROP TABLE {connection.ops.quote_name(name)}')
+                _partitions.discard(day)
+                dropped += 1
+    return dropped
+
+
+def maintain_click_log(now=None):
+    """Create the upcoming daily partitions and drop expired ones"""
+    config = get_config()
+    today = _day(now or timezone.now())
+    if connection.vendor == 'postgresql':
+        ensure_partitions({today + timedelta(days=i) for i in range(config['PARTITIONS_AHEAD'] + 1)})
+    return drop_expired_click_events(config['RETENTION_DAYS'], now=now)
@@ -0,0 +1,234 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .click_buffer import get_store, buffer_clicks
+from .click_log import record_clicks
+from .energy import current_energy, compile_expression, energy_updated_at
+from .models import Player
+from .player_cache import get_player_cache
+from .task_progress import complete_tasks
+
+
+ClickResult = namedtuple(
+    'ClickResult', ['balance', 'energy', 'max_energy', 'version', 'total_clicks', 'earned', 'last_energy_update']
+)
+
+
+def settle_clicks(player_id, clicks, now=None):
+    """
+    Atomically spend energy and credit coins for a run of clicks.
+
+    Regeneration since last_energy_update is folded into the same
+    conditional UPDATE, so concurrent clicks from one player can neither
+    lose updates nor overspend energy, and the new state comes back via
+    RETURNING without a second round-trip. last_energy_update only moves
+    by the whole seconds credited (see regenerated_snapshot()).
+
+    Returns a ClickResult, or None if the player has less than ``clicks``
+    energy (or does not exist).
+    """
+    now = now or timezone.now()
+    current, current_params = compile_expression(current_energy(now), Player, connection)
+    updated_at, updated_at_params = compile_expression(energy_updated_at(now), Player, connection)
+    table = connection.ops.quote_name(Player._meta.db_table)
+
+    sql = (
+        f'UPDATE {table} SET '
+        f'energy = {current} - %s, '
+        f'balance = balance + %s * coins_per_click, '
+        f'total_clicks = total_clicks + %s, '
+        f'last_energy_update = {updated_at}, '
+        f'version = version + 1 '
+        f'WHERE id = %s AND {current} >= %s '
+        f'RETURNING balance, energy, max_energy, version, total_clicks, %s * coins_per_click, last_energy_update'
+    )
+    params = [
+        *current_params, clicks,
+        clicks,
+        clicks,
+        *updated_at_params,
+        player_id, *current_params, clicks,
+        clicks,
+    ]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+
+    if row is None:
+        return None
+    return ClickResult(*row[:-1], _from_db('last_energy_update', row[-1]))
+
+
+def _from_db(field_name, value):
+    """Convert a raw cursor value of a Player field the way querysets do"""
+    column = Player._meta.get_field(field_name).get_col(Player._meta.db_table)
+    for converter in connection.ops.get_db_converters(column) + column.get_db_converters(connection):
+        value = converter(value, column, connection)
+    return value
+
+
+def apply_clicks(player, clicks, now=None, client_ts=None, sequence=None):
+    """
+    Spend energy and credit coins for ``clicks`` taps of a (cached) player
+    state, the way process_click does: through the click buffer when it is
+    enabled, otherwise with settle_clicks() and a write-through of the
+    player cache. Accepted clicks are queued to the click event log; when
+    settled here they also report task progress (buffered clicks do so at
+    flush time).
+
+    Returns (balance, energy, max_energy), or None if there is not enough
+    energy.
+    """
+    # With the click buffer enabled, clicks are written behind in batches
+    store = get_store()
+    if store is not None:
+        buffered = buffer_clicks(store, player, clicks, now=now)
+        if buffered is None:
+            return None
+        balance, energy = buffered
+        record_clicks(player.pk, clicks, client_ts=client_ts, sequence=sequence, now=now)
+        return balance, energy, player.max_energy
+
+    # Spend energy and credit coins in a single conditional UPDATE
+    now = now or timezone.now()
+    result = settle_clicks(player.pk, clicks, now=now)
+    if result is None:
+        return None
+
+    get_player_cache().update(
+        player.user_id,
+        balance=result.balance,
+        energy=result.energy,
+        max_energy=result.max_energy,
+        last_energy_update=result.last_energy_update,
+        version=result.version,
+        total_clicks=result.total_clicks
+    )
+    record_clicks(player.pk, clicks, client_ts=client_ts, sequence=sequence, now=now)
+    complete_tasks([
+        (player.pk, 'clicks', result.total_clicks - clicks, result.total_clicks),
+        (player.pk, 'balance', result.balance - result.earned, result.balance),
+    ])
+    return result.balance, result.energy, result.max_energy
+
+
+BatchResult = namedtuple('BatchResult', ['accepted', 'balance', 'energy', 'max_energy', 'seq'])
+
+
+class BatchRejected(Exception):
+    """Raised when a tap run does not fit the player's energy timeline"""
+
+
+class BatchConflict(BatchRejected):
+    """Raised when a batch was already settled or the player kept changing"""
+
+
+def expand_taps(count, first_ts, last_ts):
+    """
+    Spread ``count`` taps evenly between two timestamps (in seconds)
+    """
+    if count == 1:
+        yield first_ts
+        return
+    step = (last_ts - first_ts) / (count - 1)
+    for i in range(count):
+        yield first_ts + step * i
+
+
+def replay_taps(energy, max_energy, regen_rate, since, taps, now):
+    """
+    Walk a run of taps against the energy regeneration timeline.
+
+    ``taps`` are unix timestamps in ascending order; taps before ``since``
+    (the player's last energy update) or after ``now`` are clamped to that
+    window. Every tap needs one unit of energy at the moment it happened.
+    Runs in O(n) and returns the energy left at ``now``, including the
+    part of a unit still regenerating.
+    """
+    available = float(energy)
+    previous = since
+    for tap in taps:
+        tap = min(max(tap, previous), now)
+        if available < max_energy:
+            available = min(max_energy, available + (tap - previous) * regen_rate)
+        if available < 1:
+            raise BatchRejected('Not enough energy')
+        available -= 1
+        previous = tap
+
+    if available < max_energy:
+        available = min(max_energy, available + (now - previous) * regen_rate)
+    return available
+
+
+def settle_click_batch(player, seq, count, taps, pending_energy=0, now=None, retries=3):
+    """
+    Validate a run of taps and settle it with one conditional UPDATE.
+
+    The UPDATE is guarded on the snapshot the taps were replayed against and
+    on ``seq`` being newer than the last settled batch, so a concurrent write
+    forces a replay against fresh state and a resent batch is never
+    credited twice. ``pending_energy`` is energy already spent through the
+    click buffer and not yet flushed. A settled run is queued to the click
+    event log with ``seq`` as its sequence. Raises BatchRejected if the run does
+    not fit the timeline and BatchConflict if ``seq`` has been seen before.
+    """
+    now = now or timezone.now()
+    epoch = now.timestamp()
+
+    for _ in range(retries):
+        if seq <= player.last_click_seq:
+            raise BatchConflict('Duplicate or out-of-order batch')
+
+        available = replay_taps(
+            player.energy - pending_energy, player.max_energy,
+            player.energy_regen_rate, player.last_energy_update.timestamp(),
+            taps, epoch,
+        )
+        energy = int(available)
+        # Only whole units are stored: date the snapshot back by the time
+        # the rest took to regenerate so it is not lost, the way
+        # regenerated_snapshot() keeps the part of a second
+        energy_updated_at = now
+        if available < player.max_energy and player.energy_regen_rate:
+            energy_updated_at -= timedelta(seconds=(available - energy) / player.energy_regen_rate)
+        balance = player.balance + count * player.coins_per_click
+
+        updated = Player.objects.filter(
+            pk=player.pk,
+            balance=player.balance,
+            energy=player.energy,
+            last_energy_update=player.last_energy_update,
+            total_clicks=player.total_clicks,
+            last_click_seq__lt=seq,
+        ).update(
+            balance=balance,
+            energy=energy + pending_energy,
+            total_clicks=player.total_clicks + count,
+            last_energy_update=energy_updated_at,
+            last_click_seq=seq,
+            version=F('version') + 1,
+        )
+        if updated:
+            record_clicks(
+                player.pk, count, client_ts=datetime.fromtimestamp(taps[-1], dt_timezone.utc) if taps else None,
+                sequence=seq, now=now
+            )
+            complete_tasks([
+                (player.pk, 'clicks', player.total_clicks, player.total_clicks + count),
+                (player.pk, 'balance', player.balance, balance),
+            ])
+            return BatchResult(count, balance, energy, player.max_energy, seq)
+
+        # Someone else wrote the row first: replay against the new state
+        player.refresh_from_db(fields=[
+            'balance', 'energy', 'max_energy', 'energy_regen_rate',
+            'coins_per_click', 'last_energy_update', 'last_click_seq', 'total_clicks',
+        ])
+
+    raise BatchConflict('Player state changed, please retry')
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.http import HttpResponseNotModified
+from django.utils.http import parse_etags
+
+
+# Conditional GET for the catalog and player endpoints. ETags are built from
+# values the views hold without queries, the catalog snapshot's content
+# fingerprints and the player's version counter from the player cache, so
+# a matching If-None-Match is answered with a 304 before any serializer or
+# database read runs.
+
+CACHE_CONTROL = 'private, no-cache'
+
+
+def fingerprint(data):
+    """Short stable digest of ``data`` (bytes)"""
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def make_etag(*parts):
+    """A strong, quoted ETag from the string forms of ``parts``"""
+    return '"%s"' % '-'.join(str(part) for part in parts)
+
+
+def not_modified(request, etag):
+    """
+    Return a 304 response if the request's If-None-Match already lists
+    ``etag``, otherwise None. If-None-Match uses the weak comparison.
+    """
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    if '*' not in etags and etag not in (tag.removeprefix('W/') for tag in etags):
+        return None
+    return tag_response(HttpResponseNotModified(), etag)
+
+
+def tag_response(response, etag):
+    """Attach ``etag`` to a response; clients must revalidate before reuse"""
+    response['ETag'] = etag
+    response['Cache-Control'] = CACHE_CONTROL
+    return response
+
@@ -0,0 +1,179 @@
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from .click_buffer import get_store
+from .click_log import flush_click_log
+from .clicks import apply_clicks
+from .player_cache import get_player_cache
+
+
+def player_group(user_id):
+    return f'player_{user_id}'
+
+
+def notify_player(user_id, event_type, **data):
+    """
+    Push an event to a player's open game sockets once the current
+    transaction commits. A no-op when no channel layer is configured.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    message = {'type': event_type, **data}
+    transaction.on_commit(
+        lambda: async_to_sync(channel_layer.group_send)(player_group(user_id), message)
+    )
+
+
+class GameConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Persistent game channel: taps stream upstream and are settled in
+    coalesced runs, state changes are pushed downstream.
+
+    Upstream messages:
+        {"type": "tap", "count": 1}   count is optional, 1..MAX_TAPS_PER_MESSAGE
+        {"type": "sync"}              ask for the current state
+
+    Downstream messages:
+        {"type": "state", "balance": ..., "energy": ..., "max_energy": ...,
+         "energy_regen_rate": ..., "coins_per_click": ...,
+         "taps": <taps settled by this message>, "accepted": <taps credited>}
+        {"type": "upgrade", "upgrade_id": ..., "level": ...}
+        {"type": "error", "error": "..."}
+    """
+
+    # Taps received within this window are settled with one UPDATE
+    COALESCE_SECONDS = 0.2
+    MAX_TAPS_PER_MESSAGE = 100
+    MAX_PENDING_TAPS = 1000
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.player_cache = get_player_cache()
+        if await self.player_cache.aget(self.user.id) is None:
+            await self.close(code=4404)
+            return
+
+        self.pending_taps = 0
+        self.settle_task = None
+        self.group_name = player_group(self.user.id)
+        if self.channel_layer is not None:
+            await self.channel_layer.group_add(self.group_name, self.channel_name)
+
+        await self.accept()
+        await self.send_state()
+
+    async def disconnect(self, code):
+        if not hasattr(self, 'group_name'):
+            return
+        if self.settle_task is not None:
+            self.settle_task.cancel()
+        await self.settle(push=False)
+        if self.channel_layer is not None:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        message_type = content.get('type') if isinstance(content, dict) else None
+
+        if message_type == 'tap':
+            count = content.get('count', 1)
+            if not isinstance(count, int) or not 1 <= count <= self.MAX_TAPS_PER_MESSAGE:
+                await self.send_json({'type': 'error', 'error': 'Invalid tap count'})
+                return
+            if self.pending_taps + count > self.MAX_PENDING_TAPS:
+                await self.send_json({'type': 'error', 'error': 'Too many taps'})
+                return
+            self.pending_taps += count
+            if self.settle_task is None:
+                self.settle_task = asyncio.ensure_future(self.settle_later())
+        elif message_type == 'sync':
+            await self.send_state()
+        else:
+            await self.send_json({'type': 'error', 'error': 'Unknown message type'})
+
+    async def settle_later(self):
+        await asyncio.sleep(self.COALESCE_SECONDS)
+        self.settle_task = None
+        await self.settle()
+
+    async def settle(self, push=True):
+        """Settle every pending tap with one process_click-style write"""
+        taps, self.pending_taps = self.pending_taps, 0
+        if not taps:
+            return
+
+        player = await self.player_cache.aget(self.user.id)
+        accepted = min(taps, await self.available_energy(player))
+        result = await sync_to_async(self.apply)(player, accepted) if accepted > 0 else None
+        if result is None and accepted > 0:
+            # The cached state was stale: retry once against the stored row
+            await self.player_cache.ainvalidate(self.user.id)
+            player = await self.player_cache.aget(self.user.id)
+            accepted = min(taps, await self.available_energy(player))
+            result = await sync_to_async(self.apply)(player, accepted) if accepted > 0 else None
+        if result is None:
+            accepted = 0
+
+        if push:
+            await self.send_state(result, taps=taps, accepted=accepted)
+
+    def apply(self, player, clicks):
+        """apply_clicks(), then write the click event log if it is due"""
+        result = apply_clicks(player, clicks)
+        flush_click_log()
+        return result
+
+    async def available_energy(self, player):
+        """Current energy minus energy still pending in the click buffer"""
+        energy = player.get_current_energy()
+        store = get_store()
+        if store is not None:
+            pending_energy, _ = await sync_to_async(store.pending)(player.pk)
+            energy -= pending_energy
+        return energy
+
+    async def send_state(self, result=None, taps=0, accepted=0):
+        """Push the player's state, or the result of the last settlement"""
+        player = await self.player_cache.aget(self.user.id)
+        if result is not None:
+            balance, energy, max_energy = result
+        else:
+            balance, energy, max_energy = player.balance, player.get_current_energy(), player.max_energy
+            store = get_store()
+            if store is not None:
+                pending_energy, pending_balance = await sync_to_async(store.pending)(player.pk)
+                balance += pending_balance
+                energy -= pending_energy
+
+        await self.send_json({
+            'type': 'state',
+            'balance': balance,
+            'energy': energy,
+            'max_energy': max_energy,
+            'energy_regen_rate': player.energy_regen_rate,
+            'coins_per_click': player.coins_per_click,
+            'taps': taps,
+            'accepted': accepted,
+        })
+
+    # Channel layer events sent through notify_player()
+
+    async def player_changed(self, event):
+        await self.player_cache.ainvalidate(self.user.id)
+        await self.send_state()
+
+    async def player_upgrade(self, event):
+        await self.send_json({
+            'type': 'upgrade',
+            'upgrade_id': event['upgrade_id'],
+            'level': event['level'],
+        })
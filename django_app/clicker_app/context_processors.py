@@ -0,0 +1,6 @@
+from .authentication import session_player_token
+
+
+def player_token(request):
+    """Expose a valid player token of the session user as PLAYER_TOKEN"""
+    return {'PLAYER_TOKEN': session_player_token(request)}
@@ -0,0 +1,280 @@
+import atexit
+import logging
+import threading
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .click_log import EventBuffer
+from .consumers import notify_player
+from .models import Player, PlayerDailyReward, PlayerDailyRewardSummary
+from .player_cache import get_player_cache
+from .task_progress import complete_tasks
+
+
+logger = logging.getLogger(__name__)
+
+
+# The streak lives on the player row (daily_streak_day and
+# last_daily_claim_date), so a claim is one UPDATE guarded on the values
+# the claim was computed from and never reads the claim history. History
+# rows are only kept for the record: they are buffered per worker and
+# written in batches after responses are sent, like the click log, and
+# folded into monthly PlayerDailyRewardSummary rows once they are older
+# than RETENTION_DAYS.
+
+DEFAULTS = {
+    'HISTORY_BATCH_SIZE': 500,  # Buffered claims that trigger a flush
+    'HISTORY_FLUSH_INTERVAL': 1.0,  # Seconds a claim may wait for a flush
+    'HISTORY_MAX_BUFFERED': 100000,
+    # Days history rows are kept before being compacted; keep it longer
+    # than the reward cycle, whose claims daily_rewards_status lists
+    'RETENTION_DAYS': 90,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_DAILY_REWARDS', {})}
+
+
+class DailyRewardRejected(Exception):
+    """Raised when the daily reward cannot be claimed"""
+
+
+DailyClaim = namedtuple('DailyClaim', ['reward', 'balance', 'is_consecutive', 'claimed_at'])
+
+
+def next_reward_day(streak_day, rewards):
+    """Day of the reward after ``streak_day``, back to 1 past the last day"""
+    return streak_day + 1 if streak_day + 1 in rewards else 1
+
+
+def current_reward_day(player, rewards, today=None):
+    """
+    Day of the reward ``player`` can claim today, or claimed today already
+    """
+    today = today or timezone.now().date()
+    if player.last_daily_claim_date == today:
+        return player.daily_streak_day
+    return next_reward_day(player.daily_streak_day, rewards)
+
+
+def claim_streak_reward(player, now=None, retries=3):
+    """
+    Claim today's reward for ``player`` (a Player or a PlayerState from the
+    player cache) with one UPDATE guarded on the streak read with it. A
+    stale read loses the guard and is retried from a fresh one. Raises
+    DailyRewardRejected.
+
+    The new balance comes back via RETURNING: a cached state's balance may
+    lag behind the row, e.g. while clicks are buffered or after another
+    worker wrote it.
+    """
+    now = now or timezone.now()
+    today = now.date()
+    rewards = get_catalog().daily_rewards_by_day
+    if not rewards:
+        raise DailyRewardRejected('No daily rewards available')
+
+    streak_day, last_date = player.daily_streak_day, player.last_daily_claim_date
+    for _ in range(retries):
+        if last_date == today:
+            raise DailyRewardRejected('Reward already claimed today')
+
+        day = next_reward_day(streak_day, rewards)
+        reward = rewards[day]
+        coins = reward.reward_amount if reward.reward_type == 'coins' else 0
+        balance = _update_streak(player.pk, streak_day, last_date, day, today, coins)
+        if balance is not None:
+            break
+        streak_day, last_date = Player.objects.values_list(
+            'daily_streak_day', 'last_daily_claim_date'
+        ).get(pk=player.pk)
+    else:
+        raise DailyRewardRejected('Player state changed, please retry')
+
+    is_consecutive = streak_day > 0 and day == streak_day + 1
+    record_daily_claim(player.pk, reward.pk, now, is_consecutive)
+
+    # update() sends no post_save: do the signals' work
+    get_player_cache().invalidate(player.user_id)
+    notify_player(player.user_id, 'player.changed')
+    if coins:
+        complete_tasks([(player.pk, 'balance', balance - coins, balance)])
+    return DailyClaim(reward, balance, is_consecutive, now)
+
+
+def _update_streak(player_id, streak_day, last_date, day, today, coins):
+    """
+    Move the streak on if it is still (streak_day, last_date) and credit
+    ``coins``; returns the new balance, or None if the guard did not match
+    """
+    table = connection.ops.quote_name(Player._meta.db_table)
+    last_date_guard = 'last_daily_claim_date IS NULL' if last_date is None else 'last_daily_claim_date = %s'
+    sql = (
+        f'UPDATE {table} SET '
+        f'balance = balance + %s, '
+        f'daily_streak_day = %s, '
+        f'last_daily_claim_date = %s, '
+        f'daily_rewards_claimed = daily_rewards_claimed + 1, '
+        f'version = version + 1 '
+        f'WHERE id = %s AND daily_streak_day = %s AND {last_date_guard} '
+        f'RETURNING balance'
+    )
+    params = [coins, day, connection.ops.adapt_datefield_value(today), player_id, streak_day]
+    if last_date is not None:
+        params.append(connection.ops.adapt_datefield_value(last_date))
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_claim_history():
+    """Return this worker's buffer of claims waiting to be written"""
+    global _history
+    config = get_config()
+    with _history_lock:
+        if _history is None:
+            _history = EventBuffer(
+                config['HISTORY_BATCH_SIZE'], config['HISTORY_FLUSH_INTERVAL'],
+                config['HISTORY_MAX_BUFFERED']
+            )
+            atexit.register(flush_claim_history, _history, force=True)
+    return _history
+
+
+def reset_claim_history():
+    """Drop the buffer instance and its pending claims, e.g. in tests"""
+    global _history
+    with _history_lock:
+        if _history is not None:
+            _history.drain()
+        _history = None
+
+
+def record_daily_claim(player_id, reward_id, claimed_at, is_consecutive):
+    """Queue a PlayerDailyReward history row"""
+    get_claim_history().append((player_id, reward_id, claimed_at, is_consecutive))
+
+
+def flush_claim_history(history=None, force=False):
+    """
+    Write the buffered claims if a flush is due (or ``force``) with one
+    bulk INSERT, and return how many were written. Claims of a failed
+    write are put back.
+    """
+    if history is None:
+        history = get_claim_history()
+    if not (force or history.due()):
+        return 0
+
+    rows = history.drain()
+    if not rows:
+        return 0
+    try:
+        PlayerDailyReward.objects.bulk_create([
+            PlayerDailyReward(
+                player_id=player_id, reward_id=reward_id, claimed_at=claimed_at, is_consecutive=is_consecutive
+            )
+            for player_id, reward_id, claimed_at, is_consecutive in rows
+        ])
+    except Exception:
+        logger.exception('Could not write %d daily reward claims', len(rows))
+        history.requeue(rows)
+        return 0
+
+    # bulk_create() sends no post_save: bump the players for their ETags
+    player_ids = {row[0] for row in rows}
+    Player.objects.filter(pk__in=player_ids).update(version=F('version') + 1)
+    get_player_cache().invalidate_many(
+        Player.objects.filter(pk__in=player_ids).values_list('user_id', flat=True)
+    )
+    return len(rows)
+
+
+def compact_claim_history(retention_days=None, chunk_size=1000, now=None):
+    """
+    Fold PlayerDailyReward rows older than ``retention_days`` into monthly
+    PlayerDailyRewardSummary rows, in player id-ordered chunks of one
+    aggregate query, one read and one upsert of the summaries and one
+    DELETE. The players of a chunk are locked first, so a concurrent
+    compaction waits and then finds the rows gone instead of adding them
+    to the summaries twice. Returns the number of history rows compacted.
+    """
+    if retention_days is None:
+        retention_days = get_config()['RETENTION_DAYS']
+    cutoff = (now or timezone.now()) - timedelta(days=retention_days)
+    expired = PlayerDailyReward.objects.filter(claimed_at__lt=cutoff)
+
+    compacted = 0
+    last_id = 0
+    while True:
+        player_ids = list(
+            expired.filter(player_id__gt=last_id).order_by('player_id')
+            .values_list('player_id', flat=True).distinct()[:chunk_size]
+        )
+        if not player_ids:
+            break
+        last_id = player_ids[-1]
+        rows = expired.filter(player_id__in=player_ids)
+
+        with transaction.atomic():
+            # Rows are aggregated only once the chunk's players are locked
+            list(Player.objects.select_for_update().filter(pk__in=player_ids).order_by('pk').values_list('pk'))
+            totals = rows.annotate(
+                month=TruncMonth('claimed_at', output_field=DateField(), tzinfo=dt_timezone.utc)
+            ).values('player_id', 'month').annotate(
+                claims=Count('pk'),
+                consecutive_claims=Count('pk', filter=Q(is_consecutive=True)),
+                coins=Coalesce(Sum('reward__reward_amount', filter=Q(reward__reward_type='coins')), 0),
+            ).order_by()
+            totals = list(totals)
+            existing = {
+                (summary.player_id, summary.month): summary
+                for summary in PlayerDailyRewardSummary.objects.filter(
+                    player_id__in=player_ids, month__in={total['month'] for total in totals}
+                )
+            }
+            summaries = []
+            for total in totals:
+                summary = existing.get((total['player_id'], total['month'])) or PlayerDailyRewardSummary(
+                    player_id=total['player_id'], month=total['month']
+                )
+                summary.claims += total['claims']
+                summary.consecutive_claims += total['consecutive_claims']
+                summary.coins += total['coins']
+                summaries.append(summary)
+            PlayerDailyRewardSummary.objects.bulk_create(
+                summaries,
+                update_conflicts=True,
+                unique_fields=['player', 'month'],
+                update_fields=['claims', 'consecutive_claims', 'coins'],
+            )
+            # One DELETE without loading the rows: nothing a client sees
+            # changes, so the per-row delete signals are not needed
+            compacted += _delete_claims(player_ids, cutoff)
+    return compacted
+
+
+def _delete_claims(player_ids, cutoff):
+    """Delete the claims of ``player_ids`` made before ``cutoff``"""
+    table = connection.ops.quote_name(PlayerDailyReward._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(player_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE claimed_at < %s AND player_id IN ({placeholders})',
+            [connection.ops.adapt_datetimefield_value(cutoff), *player_ids],
+        )
+        return cursor.rowcount
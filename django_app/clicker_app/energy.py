@@ -0,0 +1,138 @@
+from datetime import timedelta
+
+from django.db.models import Case, DateTimeField, F, FloatField, Func, IntegerField, Value, When
+from django.db.models.functions import Cast, Floor, Greatest, Least
+from django.db.models.lookups import GreaterThanOrEqual
+from django.db.models.sql import Query
+from django.utils import timezone
+
+
+class SecondsSince(Func):
+    """
+    Seconds elapsed between a datetime expression and ``now``, kept exact
+    to the microsecond so whole seconds are never floored away.
+    """
+    output_field = FloatField()
+
+    def __init__(self, expression, now, **extra):
+        super().__init__(
+            Value(now, output_field=DateTimeField()), expression, **extra
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        now_sql, now_params = compiler.compile(self.source_expressions[0])
+        column_sql, column_params = compiler.compile(self.source_expressions[1])
+        sql = f'EXTRACT(EPOCH FROM ({now_sql} - {column_sql}))'
+        return sql, (*now_params, *column_params)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # SQLite stores datetimes as 'YYYY-MM-DD HH:MM:SS[.ffffff]' UTC text:
+        # subtract whole seconds and the fractional part separately
+        now_sql, now_params = compiler.compile(self.source_expressions[0])
+        column_sql, column_params = compiler.compile(self.source_expressions[1])
+        sql = (
+            f"((strftime('%%s', substr({now_sql}, 1, 19))"
+            f" - strftime('%%s', substr({column_sql}, 1, 19)))"
+            f" + (CAST(substr({now_sql}, 20) AS REAL)"
+            f" - CAST(substr({column_sql}, 20) AS REAL)))"
+        )
+        params = (*now_params, *column_params, *now_params, *column_params)
+        return sql, params
+
+
+class AddSeconds(Func):
+    """
+    A datetime expression moved forward by a whole number of seconds,
+    keeping its microseconds.
+    """
+    output_field = DateTimeField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        seconds_sql, seconds_params = compiler.compile(self.source_expressions[1])
+        sql = f"({column_sql} + ({seconds_sql}) * INTERVAL '1 second')"
+        return sql, (*column_params, *seconds_params)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # datetime() drops the fraction of a second: add the seconds to the
+        # 'YYYY-MM-DD HH:MM:SS' part and put the fraction back
+        column_sql, column_params = compiler.compile(self.source_expressions[0])
+        seconds_sql, seconds_params = compiler.compile(self.source_expressions[1])
+        sql = (
+            f"(datetime(substr({column_sql}, 1, 19), '+' || ({seconds_sql}) || ' seconds')"
+            f" || substr({column_sql}, 20))"
+        )
+        return sql, (*column_params, *seconds_params, *column_params)
+
+
+def regenerated_energy(energy, max_energy, regen_rate, last_update, now=None):
+    """
+    Energy at ``now`` for a stored snapshot taken at ``last_update``
+    """
+    if energy >= max_energy:
+        return energy
+
+    # Calculate seconds passed since last energy update
+    time_passed = (now or timezone.now()) - last_update
+    seconds_passed = int(time_passed.total_seconds())
+
+    # Regenerate energy (but not above max_energy)
+    return min(energy + seconds_passed * regen_rate, max_energy)
+
+
+def regenerated_snapshot(energy, max_energy, regen_rate, last_update, now=None):
+    """
+    (energy, last_update) snapshot at ``now`` equivalent to a stored one.
+
+    The timestamp only moves forward by the whole seconds credited, so the
+    part of a second already spent towards the next regeneration is kept
+    across writes; a full bar starts over from ``now``.
+    """
+    now = now or timezone.now()
+    regenerated = regenerated_energy(energy, max_energy, regen_rate, last_update, now)
+    if regenerated >= max_energy:
+        return regenerated, now
+    seconds_passed = max(int((now - last_update).total_seconds()), 0)
+    return regenerated, last_update + timedelta(seconds=seconds_passed)
+
+
+def _seconds_since_update(now):
+    """Whole seconds elapsed since last_energy_update"""
+    return Cast(Floor(SecondsSince(F('last_energy_update'), now)), IntegerField())
+
+
+def current_energy(now=None):
+    """
+    Query expression for a player's energy at ``now``.
+
+    Energy is a pure function of the stored snapshot (energy,
+    last_energy_update) and energy_regen_rate/max_energy, exactly like
+    regenerated_energy(), so it can be annotated, filtered on or
+    used inside an UPDATE without the snapshot being rewritten first.
+    """
+    now = now or timezone.now()
+    return Greatest(
+        F('energy'),
+        Least(F('max_energy'), F('energy') + _seconds_since_update(now) * F('energy_regen_rate')),
+        output_field=IntegerField(),
+    )
+
+
+def energy_updated_at(now=None):
+    """
+    Query expression for the last_energy_update stored with
+    current_energy(now), computed like regenerated_snapshot()
+    """
+    now = now or timezone.now()
+    return Case(
+        When(GreaterThanOrEqual(current_energy(now), F('max_energy')), then=Value(now, output_field=DateTimeField())),
+        default=AddSeconds(F('last_energy_update'), Greatest(_seconds_since_update(now), Value(0))),
+        output_field=DateTimeField(),
+    )
+
+
+def compile_expression(expression, model, connection):
+    """Render a query expression against ``model`` to raw SQL and params"""
+    query = Query(model)
+    compiler = query.get_compiler(connection=connection)
+    return compiler.compile(expression.resolve_expression(query))
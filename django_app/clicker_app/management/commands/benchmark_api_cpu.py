@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from clicker_app import views
+from clicker_app.catalog import bump_catalog_version
+from clicker_app.models import Player, Task
+from clicker_app.parsers import FastJSONParser
+from clicker_app.payloads import parse_click
+from clicker_app.renderers import FastJSONRenderer
+from clicker_app.serializers import ClickSerializer
+
+
+class Command(BaseCommand):
+    help = 'Measure per-request CPU of click, profile and list_tasks with the stock and fast JSON paths'
+
+    PREFIX = 'benchmark_api_'
+
+    ENDPOINTS = [
+        ('click', 'post', '/api/click/', views.process_click),
+        ('profile', 'get', '/api/player/', views.player_profile),
+        ('list_tasks', 'get', '/api/tasks/', views.list_tasks),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='Requests per endpoint and variant (default: 500)',
+            default=500
+        )
+        parser.add_argument(
+            '--tasks',
+            type=int,
+            help='Active tasks returned by list_tasks (default: 20)',
+            default=20
+        )
+
+    def handle(self, *args, **options):
+        requests = options['requests']
+
+        self.stdout.write(
+            self.style.SUCCESS(f'=== API CPU Benchmark ({requests} requests per endpoint) ===')
+        )
+        self.stdout.write(f"{'Endpoint':<12} {'Stock us/req':<14} {'Fast us/req':<14} {'Saved':<8}")
+        self.stdout.write('-' * 50)
+
+        user = User.objects.create(username=f'{self.PREFIX}player')
+        Player.objects.filter(user=user).update(
+            energy=requests * 4, max_energy=requests * 4, last_energy_update=timezone.now()
+        )
+        Task.objects.bulk_create([
+            Task(
+                name=f'{self.PREFIX}{i}', description='Benchmark task', task_type='clicks',
+                target_value=100 * (i + 1), reward_coins=10
+            )
+            for i in range(options['tasks'])
+        ])
+        # bulk_create() sends no post_save
+        bump_catalog_version()
+        client = APIClient()
+        client.force_authenticate(User.objects.get(pk=user.pk))
+
+        # The test client sends requests to the 'testserver' host
+        allowed_hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+        try:
+            allowed_hosts.enable()
+            for name, method, url, view in self.ENDPOINTS:
+                stock = self.measure(client, method, url, view, requests, JSONRenderer, JSONParser)
+                fast = self.measure(client, method, url, view, requests, FastJSONRenderer, FastJSONParser)
+                self.report(name, stock, fast)
+
+            # process_click also dropped ClickSerializer for a typed payload
+            payload = self.payload()
+            stock = self.cpu(requests, lambda: self.serializer_validate(payload))
+            fast = self.cpu(requests, lambda: parse_click(payload))
+            self.report('click body', stock, fast)
+        finally:
+            allowed_hosts.disable()
+            user.delete()
+            Task.objects.filter(name__startswith=self.PREFIX).delete()
+            bump_catalog_version()
+
+        self.stdout.write(
+            self.style.SUCCESS('=== End of API CPU Benchmark ===')
+        )
+
+    def payload(self):
+        return {
+            'clicks': 1,
+            'timestamp': timezone.now().isoformat(),
+            'energy': 0,
+            'balance': 0
+        }
+
+    def serializer_validate(self, payload):
+        """The validation process_click used to run on every click"""
+        data = payload.copy()
+        data['timestamp'] = parse_datetime(data['timestamp'])
+        serializer = ClickSerializer(data=data)
+        serializer.is_valid()
+        return serializer.validated_data
+
+    def measure(self, client, method, url, view, requests, renderer, parser):
+        """CPU seconds per request for ``view`` with the given renderer and parser"""
+        renderer_classes, parser_classes = view.cls.renderer_classes, view.cls.parser_classes
+        view.cls.renderer_classes, view.cls.parser_classes = [renderer], [parser]
+        try:
+            if method == 'post':
+                return self.cpu(requests, lambda: client.post(url, self.payload(), format='json'))
+            return self.cpu(requests, lambda: client.get(url))
+        finally:
+            view.cls.renderer_classes, view.cls.parser_classes = renderer_classes, parser_classes
+
+    def cpu(self, requests, call):
+        call()  # Warm up caches and lazy imports
+        started = time.process_time()
+        for _ in range(requests):
+            call()
+        return (time.process_time() - started) / requests
+
+    def report(self, name, stock, fast):
+        saved = (1 - fast / stock) * 100 if stock else 0
+        self.stdout.write(
+            f"{name:<12} {stock * 1e6:<14.0f} {fast * 1e6:<14.0f} {saved:>5.1f}%"
+        )
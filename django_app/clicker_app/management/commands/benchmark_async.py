@@ -0,0 +1,184 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.utils import timezone
+from clicker_app.models import Player
+from clicker_app.player_cache import reset_player_cache
+
+
+class Command(BaseCommand):
+    help = 'Compare sync (WSGI) and async (ASGI) click/profile endpoint throughput'
+
+    PREFIX = 'benchmark_async_'
+
+    ENDPOINTS = {
+        'player': ('get', '/api/player/', '/api/async/player/'),
+        'click': ('post', '/api/click/', '/api/async/click/'),
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(self.ENDPOINTS),
+            help='Endpoint to load (default: click)',
+            default='click'
+        )
+        parser.add_argument(
+            '--players',
+            type=int,
+            help='Number of simulated clients (default: 50)',
+            default=50
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            help='Requests sent by each client (default: 20)',
+            default=20
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Sync worker threads / in-flight async requests (default: 16)',
+            default=16
+        )
+
+    def handle(self, *args, **options):
+        method, sync_url, async_url = self.ENDPOINTS[options['endpoint']]
+        players = options['players']
+        requests = options['requests']
+        concurrency = options['concurrency']
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"=== Async Benchmark ({options['endpoint']}, {players} clients x "
+                f"{requests} requests, concurrency {concurrency}) ==="
+            )
+        )
+
+        users = self.seed(players, requests)
+        # The test clients send requests to the 'testserver' host
+        allowed_hosts = override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+        try:
+            allowed_hosts.enable()
+            for name, run, url in [
+                ('sync', self.run_sync, sync_url),
+                ('async', self.run_async, async_url),
+            ]:
+                reset_player_cache()
+                started = time.perf_counter()
+                latencies, errors = run(users, method, url, requests, concurrency)
+                elapsed = time.perf_counter() - started
+
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000
+                p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                self.stdout.write(
+                    f'{name:<6} {len(latencies) / elapsed:>8.1f} req/s  '
+                    f'p50={p50:.2f}ms p99={p99:.2f}ms errors={errors}'
+                )
+        finally:
+            allowed_hosts.disable()
+            self.cleanup()
+
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Async Benchmark ===')
+        )
+
+    def seed(self, count, requests):
+        """Create ``count`` players with enough energy for every click"""
+        users = [User.objects.create(username=f'{self.PREFIX}{i}') for i in range(count)]
+        # Both runs click, so leave room for twice the requests
+        Player.objects.filter(user__in=users).update(
+            energy=requests * 2,
+            max_energy=requests * 2,
+            last_energy_update=timezone.now()
+        )
+        return users
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=self.PREFIX).delete()
+
+    def payload(self):
+        return {
+            'clicks': 1,
+            'timestamp': timezone.now().isoformat(),
+            'energy': 0,
+            'balance': 0
+        }
+
+    def run_sync(self, users, method, url, requests, concurrency):
+        """Drive the WSGI handler from a fixed pool of worker threads"""
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        latencies = []
+        errors = 0
+        lock = threading.Lock()
+
+        def call(client):
+            nonlocal errors
+            started = time.perf_counter()
+            if method == 'post':
+                response = client.post(url, self.payload(), content_type='application/json')
+            else:
+                response = client.get(url)
+            latency = time.perf_counter() - started
+            with lock:
+                latencies.append(latency)
+                errors += response.status_code != 200
+
+        def worker(client):
+            try:
+                for _ in range(requests):
+                    call(client)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, clients))
+        return latencies, errors
+
+    def run_async(self, users, method, url, requests, concurrency):
+        """Drive the ASGI handler from one event loop"""
+        clients = []
+        for user in users:
+            client = AsyncClient()
+            client.force_login(user)
+            clients.append(client)
+
+        latencies = []
+        errors = 0
+
+        async def call(client, semaphore):
+            nonlocal errors
+            async with semaphore, ThreadSensitiveContext():
+                started = time.perf_counter()
+                if method == 'post':
+                    response = await client.post(url, self.payload(), content_type='application/json')
+                else:
+                    response = await client.get(url)
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code != 200
+
+        async def main():
+            semaphore = asyncio.Semaphore(concurrency)
+            await asyncio.gather(*[
+                call(client, semaphore)
+                for _ in range(requests)
+                for client in clients
+            ])
+
+        asyncio.run(main())
+        return latencies, errors
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from clicker_app.click_buffer import ShardedCounterStore, buffer_clicks, flush_click_buffer
+from clicker_app.clicks import settle_clicks
+from clicker_app.models import Player
+
+
+class Command(BaseCommand):
+    help = 'Compare click throughput on the Player row and on sharded counters against writers per player'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers',
+            type=int,
+            nargs='+',
+            help='Concurrent writers for one player (default: 1 2 4 8 16)',
+            default=[1, 2, 4, 8, 16]
+        )
+        parser.add_argument(
+            '--clicks',
+            type=int,
+            help='Clicks sent by each writer (default: 200)',
+            default=200
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            help='Counter shards per player (default: 8)',
+            default=8
+        )
+
+    def handle(self, *args, **options):
+        clicks = options['clicks']
+        store = ShardedCounterStore(options['shards'])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"=== Balance Contention Benchmark ({options['shards']} shards) ===")
+        )
+        self.stdout.write(
+            f"{'Writers':<8} {'Row clicks/s':<14} {'Shard clicks/s':<16} {'Balance ok':<10}"
+        )
+        self.stdout.write('-' * 50)
+
+        user, created = User.objects.get_or_create(username='benchmark_shards')
+        player, created = Player.objects.get_or_create(user=user)
+
+        try:
+            for writers in options['writers']:
+                total = writers * clicks
+
+                self.reset(player, total)
+                row_rate = total / self.run(writers, clicks, lambda: settle_clicks(player.pk, 1))
+
+                self.reset(player, total)
+                state = Player.objects.get(pk=player.pk)
+                shard_rate = total / self.run(writers, clicks, lambda: buffer_clicks(store, state, 1))
+                flush_click_buffer(store)
+
+                player.refresh_from_db()
+                self.stdout.write(
+                    f"{writers:<8} {row_rate:<14.0f} {shard_rate:<16.0f} {str(player.balance == total):<10}"
+                )
+        finally:
+            user.delete()
+
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Balance Contention Benchmark ===')
+        )
+
+    def reset(self, player, total):
+        Player.objects.filter(pk=player.pk).update(
+            balance=0,
+            energy=total,
+            max_energy=total,
+            energy_regen_rate=0,
+            coins_per_click=1,
+            last_energy_update=timezone.now()
+        )
+        player.counter_shards.all().delete()
+
+    def run(self, writers, clicks, click):
+        """Run ``writers`` threads of ``clicks`` clicks, return the elapsed seconds"""
+        barrier = threading.Barrier(writers + 1)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(clicks):
+                    click()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - started
@@ -0,0 +1,106 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from clicker_app.clicks import settle_clicks
+from clicker_app.models import Player
+
+
+class Command(BaseCommand):
+    help = 'Compare the legacy read-modify-write click path with atomic settlement'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads',
+            type=int,
+            help='Number of concurrent clickers for one player (default: 8)',
+            default=8
+        )
+        parser.add_argument(
+            '--clicks',
+            type=int,
+            help='Clicks sent by each thread (default: 200)',
+            default=200
+        )
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        clicks = options['clicks']
+        total = threads * clicks
+
+        self.stdout.write(
+            self.style.SUCCESS(f'=== Click Benchmark ({threads} threads x {clicks} clicks) ===')
+        )
+
+        user, created = User.objects.get_or_create(username='benchmark_clicker')
+        player, created = Player.objects.get_or_create(user=user)
+
+        try:
+            for name, click in [('legacy', self.legacy_click), ('atomic', self.atomic_click)]:
+                Player.objects.filter(pk=player.pk).update(
+                    balance=0,
+                    energy=total,
+                    max_energy=total,
+                    energy_regen_rate=0,
+                    coins_per_click=1,
+                    last_energy_update=timezone.now()
+                )
+
+                latencies = self.run(player.pk, click, threads, clicks)
+                player.refresh_from_db()
+
+                latencies.sort()
+                p50 = statistics.median(latencies) * 1000
+                p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+                lost = total - player.balance
+
+                self.stdout.write(
+                    f'{name:<8} balance={player.balance:<8} lost={lost:<6} '
+                    f'p50={p50:.2f}ms p99={p99:.2f}ms'
+                )
+        finally:
+            user.delete()
+
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Click Benchmark ===')
+        )
+
+    def run(self, player_id, click, threads, clicks):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            local = []
+            try:
+                for _ in range(clicks):
+                    started = time.perf_counter()
+                    click(player_id)
+                    local.append(time.perf_counter() - started)
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(local)
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return latencies
+
+    def legacy_click(self, player_id):
+        """The original process_click path: read the row, then save it back"""
+        player = Player.objects.get(pk=player_id)
+        if player.energy < 1:
+            return
+        player.energy -= 1
+        player.balance += player.coins_per_click
+        player.last_energy_update = timezone.now()
+        player.save(update_fields=['energy', 'balance', 'last_energy_update'])
+
+    def atomic_click(self, player_id):
+        settle_clicks(player_id, 1)
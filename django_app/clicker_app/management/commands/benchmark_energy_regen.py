@@ -0,0 +1,79 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from clicker_app.models import Player
+from clicker_app.tasks import regenerate_energy
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the regenerate_energy task against the number of active players'
+
+    PREFIX = 'benchmark_regen_'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--players',
+            type=int,
+            nargs='+',
+            help='Active player counts to benchmark (default: 1000 10000)',
+            default=[1000, 10000]
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Players per UPDATE (default: 1000)',
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        self.stdout.write(
+            self.style.SUCCESS(f'=== Energy Regeneration Benchmark (chunk size {chunk_size}) ===')
+        )
+        self.stdout.write(
+            f"{'Players':<10} {'Updated':<10} {'Chunks':<8} {'Total ms':<10} {'Max chunk ms':<14} {'Avg chunk ms':<12}"
+        )
+        self.stdout.write('-' * 70)
+
+        try:
+            for count in options['players']:
+                self.seed(count)
+                result = regenerate_energy(chunk_size=chunk_size)
+                self.stdout.write(
+                    f"{count:<10} "
+                    f"{result['updated']:<10} "
+                    f"{result['chunks']:<8} "
+                    f"{result['duration_ms']:<10} "
+                    f"{result['max_chunk_ms']:<14} "
+                    f"{result['avg_chunk_ms']:<12}"
+                )
+                self.cleanup()
+        finally:
+            self.cleanup()
+
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Energy Regeneration Benchmark ===')
+        )
+
+    def seed(self, count):
+        """Create ``count`` players that have been regenerating for a minute"""
+        # bulk_create skips the post_save signal that would create players one by one
+        User.objects.bulk_create(
+            [User(username=f'{self.PREFIX}{i}') for i in range(count)],
+            batch_size=1000
+        )
+        users = User.objects.filter(username__startswith=self.PREFIX)
+        last_update = timezone.now() - timedelta(minutes=1)
+        Player.objects.bulk_create(
+            [
+                Player(user=user, energy=0, max_energy=1000, last_energy_update=last_update)
+                for user in users
+            ],
+            batch_size=1000
+        )
+
+    def cleanup(self):
+        User.objects.filter(username__startswith=self.PREFIX).delete()
@@ -34,18 +34,18 @@ class Command(BaseCommand):
         )
 
         # Get players based on filter options
-        players = Player.objects.all()
+        players = Player.objects.with_current_energy()
         
         if low_energy:
-            players = players.filter(energy__lt=F('max_energy') * 0.1)
+            players = players.filter(current_energy__lt=F('max_energy') * 0.1)
             self.stdout.write('Filter: Low Energy (< 10% of max)')
         elif full_energy:
-            players = players.filter(energy=F('max_energy'))
+            players = players.filter(current_energy__gte=F('max_energy'))
             self.stdout.write('Filter: Full Energy')
         else:
             self.stdout.write('Showing all players')
 
-        players = players.order_by('-energy')[:limit]
+        players = players.order_by('-current_energy')[:limit]
 
         if not players.exists():
             self.stdout.write('No players found matching criteria.')
@@ -59,12 +59,12 @@ class Command(BaseCommand):
 
         # Player data
         for player in players:
-            energy_percent = (player.energy / player.max_energy) * 100
+            energy_percent = (player.current_energy / player.max_energy) * 100
             status = self.get_energy_status(energy_percent)
             
             self.stdout.write(
                 f"{player.username:<15} "
-                f"{player.energy}/{player.max_energy:<10} "
+                f"{player.current_energy}/{player.max_energy:<10} "
                 f"{player.energy_regen_rate:<12} "
                 f"{status:<15}"
             )
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from clicker_app.models import Upgrade, DailyReward, Task
+from clicker_app.catalog import get_catalog
 
 
 class Command(BaseCommand):
@@ -25,10 +25,13 @@ class Command(BaseCommand):
         self.stdout.write(f'  Host: {db_config.get("HOST", "Not set")}')
         self.stdout.write(f'  Port: {db_config.get("PORT", "Not set")}')
 
+        # Upgrades, rewards and tasks all come from one catalog snapshot
+        catalog = get_catalog()
+        self.stdout.write(f'\nCatalog Version: {catalog.version}')
+
         # Show upgrade configuration
         self.stdout.write('\nUpgrade Configuration:')
-        upgrades = Upgrade.objects.filter(is_active=True).order_by('order')
-        for upgrade in upgrades:
+        for upgrade in catalog.upgrades:
             self.stdout.write(
                 f'  {upgrade.name}: '
                 f'Base Cost={upgrade.base_cost}, '
@@ -38,8 +41,7 @@ class Command(BaseCommand):
 
         # Show daily reward configuration
         self.stdout.write('\nDaily Reward Configuration:')
-        rewards = DailyReward.objects.all().order_by('day')
-        for reward in rewards:
+        for reward in catalog.daily_rewards:
             self.stdout.write(
                 f'  Day {reward.day}: '
                 f'{reward.reward_amount} {reward.reward_type}'
@@ -48,8 +50,7 @@ class Command(BaseCommand):
 
         # Show task configuration
         self.stdout.write('\nTask Configuration:')
-        tasks = Task.objects.filter(is_active=True).order_by('order')
-        for task in tasks:
+        for task in catalog.tasks:
             self.stdout.write(
                 f'  {task.name}: '
                 f'Type={task.task_type}, '
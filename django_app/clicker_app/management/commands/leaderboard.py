@@ -36,10 +36,13 @@ class Command(BaseCommand):
         )
 
         # Get players sorted by the specified field
+        players = Player.objects.with_current_energy().with_total_balance()
         if sort_by == 'energy':
-            players = Player.objects.order_by('-energy', '-balance')[:limit]
+            players = players.order_by('-current_energy', '-total_balance')[:limit]
+        elif sort_by == 'balance':
+            players = players.order_by('-total_balance')[:limit]
         else:
-            players = Player.objects.order_by(f'-{sort_by}', '-balance')[:limit]
+            players = players.order_by(f'-{sort_by}', '-total_balance')[:limit]
 
         if not players.exists():
             self.stdout.write('No players found.')
@@ -56,9 +59,9 @@ class Command(BaseCommand):
             self.stdout.write(
                 f"{i:<4} "
                 f"{player.username:<15} "
-                f"{player.balance:<12} "
+                f"{player.total_balance:<12} "
                 f"{player.level:<6} "
-                f"{player.energy}/{player.max_energy:<10}"
+                f"{player.current_energy}/{player.max_energy:<10}"
             )
 
         self.stdout.write(
@@ -28,7 +28,7 @@ class Command(BaseCommand):
                 f"{player.username:<15} "
                 f"{player.balance:<10} "
                 f"{player.level:<6} "
-                f"{player.energy}/{player.max_energy:<10} "
+                f"{player.get_current_energy()}/{player.max_energy:<10} "
                 f"{player.coins_per_click:<8}"
             )
 
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from clicker_app.task_state import backfill_bitmaps, get_config
+
+
+class Command(BaseCommand):
+    help = 'Backfill per-player task state bitsets from PlayerTask rows for the bitmap storage mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Players read and written per chunk (default: 1000)',
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS('=== Migrate Task State ===')
+        )
+
+        started = time.monotonic()
+        players, rows = backfill_bitmaps(chunk_size=options['chunk_size'])
+
+        self.stdout.write(f'PlayerTask rows folded: {rows}')
+        self.stdout.write(f'Players written: {players}')
+        self.stdout.write(f'Duration: {time.monotonic() - started:.2f}s')
+        if get_config()['STORAGE'] != 'bitmap':
+            self.stdout.write(
+                self.style.WARNING("CLICKER_TASK_STATE['STORAGE'] is not 'bitmap' yet; set it to switch over")
+            )
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Migrate Task State ===')
+        )
@@ -37,7 +37,7 @@ class Command(BaseCommand):
         self.stdout.write(f'Player ID: {player.id}')
         self.stdout.write(f'Balance: {player.balance}')
         self.stdout.write(f'Level: {player.level}')
-        self.stdout.write(f'Energy: {player.energy}/{player.max_energy}')
+        self.stdout.write(f'Energy: {player.get_current_energy()}/{player.max_energy}')
         self.stdout.write(f'Coins per Click: {player.coins_per_click}')
         self.stdout.write(f'Energy Regen Rate: {player.energy_regen_rate}')
         self.stdout.write(f'Created: {player.created_at}')
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from clicker_app.stats import recompute_player_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute every player\'s coins per click, max energy and regen rate from their upgrade levels'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Players read and updated per chunk (default: 1000)',
+            default=1000
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            self.style.SUCCESS('=== Recompute Player Stats ===')
+        )
+
+        started = time.monotonic()
+        checked, updated = recompute_player_stats(chunk_size=options['chunk_size'])
+
+        self.stdout.write(f'Players checked: {checked}')
+        self.stdout.write(f'Players updated: {updated}')
+        self.stdout.write(f'Duration: {time.monotonic() - started:.2f}s')
+        self.stdout.write(
+            self.style.SUCCESS('=== End of Recompute Player Stats ===')
+        )
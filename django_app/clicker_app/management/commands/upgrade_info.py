@@ -37,10 +37,12 @@ class Command(BaseCommand):
 
         # Cost calculation for next few levels
         self.stdout.write(f'\nCost for next levels:')
-        for level in range(0, min(5, upgrade.max_level)):
-            cost = upgrade.get_cost(level)
-            if cost is not None:
-                self.stdout.write(f'  Level {level + 1}: {cost} coins')
+        costs = upgrade.cost_table()
+        for level, cost in enumerate(costs[:5]):
+            self.stdout.write(f'  Level {level + 1}: {cost} coins')
+        if len(costs) < upgrade.max_level:
+            self.stdout.write(f'  Levels above {len(costs)} cost more than a balance can hold')
+        self.stdout.write(f'Total cost to max level: {sum(costs)} coins')
 
         # Players who have purchased this upgrade
         self.stdout.write(f'\nPlayers with this upgrade:')
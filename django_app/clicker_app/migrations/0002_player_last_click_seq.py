@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='last_click_seq',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0002_player_last_click_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
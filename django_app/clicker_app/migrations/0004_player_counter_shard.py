@@ -0,0 +1,27 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0003_player_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('balance', models.BigIntegerField(default=0)),
+                ('energy', models.BigIntegerField(default=0)),
+                ('player', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_shards', to='clicker_app.player')),
+            ],
+            options={
+                'unique_together': {('player', 'shard')},
+            },
+        ),
+    ]
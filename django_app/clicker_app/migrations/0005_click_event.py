@@ -0,0 +1,75 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# ClickEvent is unmanaged: on PostgreSQL it is a table partitioned by day on
+# server_ts, whose primary key has to include the partition key. Partitions
+# are created on demand by clicker_app.click_log. Other databases get a plain
+# table.
+
+POSTGRES_CREATE = [
+    '''
+    CREATE TABLE clicker_app_clickevent (
+        id bigint GENERATED BY DEFAULT AS IDENTITY,
+        player_id bigint NOT NULL,
+        count integer NOT NULL CHECK (count >= 0),
+        server_ts timestamp with time zone NOT NULL,
+        client_ts timestamp with time zone NULL,
+        sequence bigint NULL,
+        PRIMARY KEY (id, server_ts)
+    ) PARTITION BY RANGE (server_ts)
+    ''',
+    '''
+    CREATE INDEX clicker_app_clickevent_player_ts
+        ON clicker_app_clickevent (player_id, server_ts)
+    ''',
+]
+
+
+def create_click_event_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for sql in POSTGRES_CREATE:
+            schema_editor.execute(sql)
+    else:
+        model = apps.get_model('clicker_app', 'ClickEvent')
+        schema_editor.create_model(model)
+        # create_model() skips the indexes of unmanaged models
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)
+
+
+def drop_click_event_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        # Dropping a partitioned table drops its partitions
+        schema_editor.execute('DROP TABLE clicker_app_clickevent')
+    else:
+        schema_editor.delete_model(apps.get_model('clicker_app', 'ClickEvent'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0004_player_counter_shard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClickEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField()),
+                ('server_ts', models.DateTimeField()),
+                ('client_ts', models.DateTimeField(blank=True, null=True)),
+                ('sequence', models.BigIntegerField(blank=True, null=True)),
+                ('player', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='click_events', to='clicker_app.player')),
+            ],
+            options={
+                'db_table': 'clicker_app_clickevent',
+                'managed': False,
+                'indexes': [models.Index(fields=['player', 'server_ts'], name='clicker_app_player__4bff02_idx')],
+            },
+        ),
+        migrations.RunPython(create_click_event_table, drop_click_event_table),
+    ]
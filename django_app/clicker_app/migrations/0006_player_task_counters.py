@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 10:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    # Clicks made before the counter existed are not recorded anywhere
+    # complete, so total_clicks starts from zero
+    Player = apps.get_model('clicker_app', 'Player')
+    PlayerUpgrade = apps.get_model('clicker_app', 'PlayerUpgrade')
+    Referral = apps.get_model('clicker_app', 'Referral')
+
+    levels = PlayerUpgrade.objects.filter(player=OuterRef('pk')).values('player').annotate(
+        total=Sum('level')
+    ).values('total')
+    referrals = Referral.objects.filter(referrer=OuterRef('pk')).values('referrer').annotate(
+        total=Count('pk')
+    ).values('total')
+    Player.objects.update(
+        upgrades_purchased=Coalesce(Subquery(levels), 0),
+        referral_count=Coalesce(Subquery(referrals), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0005_click_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='referral_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='total_clicks',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='upgrades_purchased',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0006_player_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerTaskState',
+            fields=[
+                ('player', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_state', serialize=False, to='clicker_app.player')),
+                ('completed', models.BinaryField(default=b'')),
+                ('claimed', models.BinaryField(default=b'')),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:08
+
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def backfill_streaks(apps, schema_editor):
+    # The streak continues from each player's latest claim. Claims were
+    # compared by UTC date, so the date is truncated in UTC
+    Player = apps.get_model('clicker_app', 'Player')
+    PlayerDailyReward = apps.get_model('clicker_app', 'PlayerDailyReward')
+
+    latest = PlayerDailyReward.objects.filter(player=OuterRef('pk')).order_by('-claimed_at')
+    Player.objects.update(
+        daily_streak_day=Coalesce(Subquery(latest.values('reward__day')[:1]), 0),
+        last_daily_claim_date=Subquery(
+            latest.annotate(date=TruncDate('claimed_at', tzinfo=timezone.utc)).values('date')[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0007_player_task_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='player',
+            name='daily_streak_day',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='last_daily_claim_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
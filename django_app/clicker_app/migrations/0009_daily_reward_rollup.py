@@ -0,0 +1,55 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_claims(apps, schema_editor):
+    Player = apps.get_model('clicker_app', 'Player')
+    PlayerDailyReward = apps.get_model('clicker_app', 'PlayerDailyReward')
+
+    claims = PlayerDailyReward.objects.filter(player=OuterRef('pk')).values('player').annotate(
+        total=Count('pk')
+    ).values('total')
+    Player.objects.update(daily_rewards_claimed=Coalesce(Subquery(claims), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0008_player_daily_streak'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerDailyRewardSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('claims', models.IntegerField(default=0)),
+                ('consecutive_claims', models.IntegerField(default=0)),
+                ('coins', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='player',
+            name='daily_rewards_claimed',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='playerdailyreward',
+            index=models.Index(fields=['player', 'claimed_at'], name='clicker_app_player__126c66_idx'),
+        ),
+        migrations.AddField(
+            model_name='playerdailyrewardsummary',
+            name='player',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='clicker_app.player'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='playerdailyrewardsummary',
+            unique_together={('player', 'month')},
+        ),
+        migrations.RunPython(backfill_claims, migrations.RunPython.noop),
+    ]
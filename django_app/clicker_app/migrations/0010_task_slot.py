@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+def _bits(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def _bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _remap(bits, slots):
+    remapped = 0
+    for task_id, slot in slots.items():
+        if bits >> task_id & 1:
+            remapped |= 1 << slot
+    return remapped
+
+
+def assign_slots(apps, schema_editor):
+    Task = apps.get_model('clicker_app', 'Task')
+    PlayerTaskState = apps.get_model('clicker_app', 'PlayerTaskState')
+
+    tasks = list(Task.objects.order_by('pk'))
+    for slot, task in enumerate(tasks):
+        task.slot = slot
+    Task.objects.bulk_update(tasks, ['slot'])
+
+    # Bitsets were indexed by task id until now
+    slots = {task.pk: task.slot for task in tasks}
+    states = []
+    for state in PlayerTaskState.objects.iterator(chunk_size=1000):
+        state.completed = _bytes(_remap(_bits(state.completed), slots))
+        state.claimed = _bytes(_remap(_bits(state.claimed), slots))
+        states.append(state)
+        if len(states) == 1000:
+            PlayerTaskState.objects.bulk_update(states, ['completed', 'claimed'])
+            states = []
+    PlayerTaskState.objects.bulk_update(states, ['completed', 'claimed'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0009_daily_reward_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='slot',
+            field=models.PositiveIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(assign_slots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='task',
+            name='slot',
+            field=models.PositiveIntegerField(editable=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0010_task_slot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='playercountershard',
+            name='spent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
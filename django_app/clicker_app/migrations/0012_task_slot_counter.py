@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clicker_app', '0011_playercountershard_spent_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskSlotCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('next_slot', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,6 +1,27 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from .energy import current_energy, regenerated_energy, regenerated_snapshot
+from .upgrade_costs import affordable_levels, effect_of_levels, get_cost_prefix, get_cost_table
+
+
+class PlayerQuerySet(models.QuerySet):
+    def with_current_energy(self, now=None):
+        """Annotate each player with their regenerated energy as current_energy"""
+        return self.annotate(current_energy=current_energy(now))
+
+    def with_total_balance(self):
+        """
+        Annotate each player with their balance plus coins still sitting in
+        counter shards (see PlayerCounterShard) as total_balance
+        """
+        shards = PlayerCounterShard.objects.filter(player=models.OuterRef('pk')).values(
+            'player'
+        ).annotate(total=models.Sum('balance')).values('total')
+        return self.annotate(
+            total_balance=models.F('balance') + Coalesce(models.Subquery(shards), 0)
+        )
 
 
 class Player(models.Model):
@@ -14,44 +35,101 @@ class Player(models.Model):
     energy_regen_rate = models.IntegerField(default=1)  # Energy regenerated per second
     coins_per_click = models.IntegerField(default=1)
     last_energy_update = models.DateTimeField(default=timezone.now)
+    last_click_seq = models.BigIntegerField(default=0)  # Last settled client click batch
+    # Counters behind the clicks, upgrades and referrals task types
+    total_clicks = models.BigIntegerField(default=0)
+    upgrades_purchased = models.IntegerField(default=0)  # Upgrade levels bought
+    referral_count = models.IntegerField(default=0)
+    # Daily reward streak: day of the last reward claimed and the date of the claim
+    daily_streak_day = models.IntegerField(default=0)
+    last_daily_claim_date = models.DateField(null=True, blank=True)
+    daily_rewards_claimed = models.IntegerField(default=0)  # Lifetime claims
+    version = models.BigIntegerField(default=0)  # Bumped on every game state write
     last_login = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(default=timezone.now)
     is_verified = models.BooleanField(default=False)
 
-    def get_current_energy(self):
+    objects = PlayerQuerySet.as_manager()
+
+    def get_current_energy(self, now=None):
         """
         Calculate current energy based on time passed since last update
         """
-        if self.energy >= self.max_energy:
-            return self.energy
-        
-        # Calculate seconds passed since last energy update
-        time_passed = timezone.now() - self.last_energy_update
-        seconds_passed = int(time_passed.total_seconds())
-        
-        # Calculate energy regenerated
-        energy_regenerated = seconds_passed * self.energy_regen_rate
-        
-        # Update energy (but not above max_energy)
-        new_energy = min(self.energy + energy_regenerated, self.max_energy)
-        
-        return new_energy
-
-    def update_energy(self):
+        return regenerated_energy(
+            self.energy, self.max_energy, self.energy_regen_rate,
+            self.last_energy_update, now
+        )
+
+    def bump_version(self):
         """
-        Update energy and last_energy_update timestamp
+        Mark the player's game state as changed, invalidating cached copies.
+        Returns the field to add to the write's update_fields.
         """
-        current_energy = self.get_current_energy()
-        if current_energy != self.energy:
-            self.energy = current_energy
-            self.last_energy_update = timezone.now()
-            self.save(update_fields=['energy', 'last_energy_update'])
-        return self.energy
+        self.version = models.F('version') + 1
+        return ['version']
+
+    def snapshot_energy(self, now=None):
+        """
+        Fold regenerated energy into the stored snapshot before a mutation.
+        Energy is otherwise computed on read, so this does not save; it
+        returns the fields to add to the mutation's update_fields.
+        """
+        self.energy, self.last_energy_update = regenerated_snapshot(
+            self.energy, self.max_energy, self.energy_regen_rate,
+            self.last_energy_update, now
+        )
+        return ['energy', 'last_energy_update']
 
     def __str__(self):
         return f"{self.username or self.user.username} (Level {self.level})"
 
 
+class PlayerCounterShard(models.Model):
+    """
+    One of N sub-rows holding a hot player's uncompacted balance and energy
+    deltas, so concurrent clicks update different rows instead of queueing
+    on the Player row lock. Folded back into Player by the compactor.
+    """
+    player = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='counter_shards')
+    shard = models.PositiveSmallIntegerField()
+    balance = models.BigIntegerField(default=0)  # Coins earned
+    energy = models.BigIntegerField(default=0)  # Energy spent
+    spent_at = models.DateTimeField(null=True, blank=True)  # Earliest uncompacted spend
+
+    class Meta:
+        unique_together = ('player', 'shard')
+
+    def __str__(self):
+        return f"{self.player} - shard {self.shard}"
+
+
+class ClickEvent(models.Model):
+    """
+    Append-only log of settled clicks, for analytics, anti-cheat and
+    reconciliation. Rows are buffered in memory and written in batches by
+    click_log. On PostgreSQL the table is range-partitioned by day on
+    server_ts (see migration 0005), so it is not managed by Django and old
+    days are dropped as whole partitions.
+    """
+    player = models.ForeignKey(
+        Player, on_delete=models.DO_NOTHING, db_constraint=False, related_name='click_events'
+    )
+    count = models.PositiveIntegerField()
+    server_ts = models.DateTimeField()
+    client_ts = models.DateTimeField(null=True, blank=True)
+    sequence = models.BigIntegerField(null=True, blank=True)  # Client batch seq, when there is one
+
+    class Meta:
+        managed = False
+        db_table = 'clicker_app_clickevent'
+        indexes = [
+            models.Index(fields=['player', 'server_ts']),
+        ]
+
+    def __str__(self):
+        return f"{self.player_id} x{self.count} at {self.server_ts}"
+
+
 class Upgrade(models.Model):
     UPGRADE_TYPES = [
         ('coins_per_click', 'Coins Per Click'),
@@ -80,9 +158,33 @@ class Upgrade(models.Model):
 
     def get_cost(self, current_level):
         """Calculate the cost of upgrading to the next level"""
-        if current_level >= self.max_level:
-            return None  # Already at max level
-        return int(self.base_cost * (self.cost_multiplier ** current_level))
+        table = self.cost_table()
+        if not 0 <= current_level < len(table):
+            return None  # Already at max level (or past the largest storable cost)
+        return table[current_level]
+
+    def cost_table(self):
+        """Exact cost of every level, precomputed once per process"""
+        return get_cost_table(self)
+
+    def get_cost_of_levels(self, current_level, levels):
+        """Total cost of buying ``levels`` levels, or None past max level"""
+        prefix = get_cost_prefix(self)
+        if current_level < 0 or levels < 0 or current_level + levels >= len(prefix):
+            return None
+        return prefix[current_level + levels] - prefix[current_level]
+
+    def get_affordable_levels(self, current_level, budget):
+        """Return (levels, total cost) of the most levels ``budget`` buys"""
+        prefix = get_cost_prefix(self)
+        if current_level < 0 or budget < 0:
+            return 0, 0
+        levels = affordable_levels(prefix, current_level, budget)
+        return levels, prefix[current_level + levels] - prefix[current_level]
+
+    def get_effect_of_levels(self, current_level, levels):
+        """Combined effect of the next ``levels`` levels"""
+        return effect_of_levels(self.base_effect_value, self.effect_per_level, current_level, levels)
 
 
 class PlayerUpgrade(models.Model):
@@ -117,10 +219,40 @@ class PlayerDailyReward(models.Model):
     claimed_at = models.DateTimeField(default=timezone.now)
     is_consecutive = models.BooleanField(default=True)  # Whether this is part of a streak
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['player', 'claimed_at']),
+        ]
+
     def __str__(self):
         return f"{self.player.username} - {self.reward}"
 
 
+class PlayerDailyRewardSummary(models.Model):
+    """
+    Daily reward claims of one player in one month, compacted from
+    PlayerDailyReward rows past the retention window
+    """
+    player = models.ForeignKey(Player, on_delete=models.CASCADE)
+    month = models.DateField()  # First day of the month
+    claims = models.IntegerField(default=0)
+    consecutive_claims = models.IntegerField(default=0)
+    coins = models.BigIntegerField(default=0)  # Coins from coin rewards
+
+    class Meta:
+        unique_together = ('player', 'month')
+
+    def __str__(self):
+        return f"{self.player.username} - {self.month:%Y-%m}: {self.claims} claims"
+
+
+class TaskQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        Task.assign_slots(objs)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class Task(models.Model):
     TASK_TYPES = [
         ('clicks', 'Total Clicks'),
@@ -138,14 +270,56 @@ class Task(models.Model):
     reward_energy = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
     order = models.IntegerField(default=0)
+    # Bit of the task in PlayerTaskState bitsets: numbered from 0 in
+    # creation order, so bitsets grow with the number of tasks and not with
+    # their ids. Slots come from TaskSlotCounter and are never reused, so a
+    # new task cannot take over the bits a deleted task left set.
+    slot = models.PositiveIntegerField(unique=True, editable=False)
+
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         ordering = ['order']
 
+    @classmethod
+    def assign_slots(cls, tasks):
+        """Give fresh slots to the tasks of ``tasks`` without one"""
+        new = [task for task in tasks if task.slot is None]
+        if new:
+            for slot, task in enumerate(new, start=TaskSlotCounter.allocate(len(new))):
+                task.slot = slot
+
+    def save(self, *args, **kwargs):
+        self.assign_slots([self])
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
 
+class TaskSlotCounter(models.Model):
+    """
+    Single row holding the next unused Task.slot. The row is locked while
+    slots are handed out, so concurrent task creations get distinct slots.
+    """
+    next_slot = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def allocate(cls, count):
+        """Reserve ``count`` consecutive slots and return the first"""
+        with transaction.atomic():
+            counter, _ = cls.objects.select_for_update().get_or_create(pk=1)
+            # Tasks loaded from fixtures bring their own slots
+            last = Task.objects.aggregate(last=models.Max('slot'))['last']
+            start = max(counter.next_slot, 0 if last is None else last + 1)
+            counter.next_slot = start + count
+            counter.save(update_fields=['next_slot'])
+        return start
+
+    def __str__(self):
+        return f"Next task slot: {self.next_slot}"
+
+
 class PlayerTask(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     task = models.ForeignKey(Task, on_delete=models.CASCADE)
@@ -160,6 +334,22 @@ class PlayerTask(models.Model):
         return f"{self.player.username} - {self.task.name}"
 
 
+class PlayerTaskState(models.Model):
+    """
+    Compact task state of one player, used instead of PlayerTask rows when
+    CLICKER_TASK_STATE['STORAGE'] is 'bitmap'. Bit n of each bitset is the
+    task with slot n; progress of tasks in flight is the player's counter
+    for the task type.
+    """
+    player = models.OneToOneField(Player, on_delete=models.CASCADE, primary_key=True, related_name='task_state')
+    completed = models.BinaryField(default=b'')
+    claimed = models.BinaryField(default=b'')
+    claimed_at = models.DateTimeField(null=True, blank=True)  # Latest reward claim
+
+    def __str__(self):
+        return f"Task state of player {self.player_id}"
+
+
 class Referral(models.Model):
     referrer = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='referrals')
     referred = models.ForeignKey(Player, on_delete=models.CASCADE, related_name='referred_by')
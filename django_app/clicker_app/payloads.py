@@ -0,0 +1,138 @@
+from collections import namedtuple
+from collections.abc import Mapping
+from datetime import datetime
+
+from django.utils import timezone
+
+
+# Lightweight typed payloads for the hottest write endpoints. They accept
+# the same input as ClickSerializer/UpgradePurchaseSerializer and report
+# errors in the same {'field': ['message']} shape, without building DRF
+# fields and validators on every request.
+
+
+class PayloadError(Exception):
+    """Raised with DRF-style field errors when a payload does not validate"""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _check_mapping(data):
+    if not isinstance(data, Mapping):
+        raise PayloadError({
+            'non_field_errors': [f'Invalid data. Expected a dictionary, but got {type(data).__name__}.']
+        })
+
+
+def _integer(data, name, errors, min_value=None, max_value=None, required=True):
+    value = data.get(name)
+    if value is None or value == '':
+        if required:
+            errors[name] = ['This field is required.']
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        errors[name] = ['A valid integer is required.']
+        return None
+    if isinstance(value, str):
+        try:
+            value = int(value.strip())
+        except ValueError:
+            errors[name] = ['A valid integer is required.']
+            return None
+    if min_value is not None and value < min_value:
+        errors[name] = [f'Ensure this value is greater than or equal to {min_value}.']
+        return None
+    if max_value is not None and value > max_value:
+        errors[name] = [f'Ensure this value is less than or equal to {max_value}.']
+        return None
+    return value
+
+
+def _datetime(data, name, errors):
+    value = data.get(name)
+    if value is None or value == '':
+        errors[name] = ['This field is required.']
+        return None
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            errors[name] = ['Datetime has wrong format. Use ISO 8601.']
+            return None
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+ClickPayload = namedtuple('ClickPayload', ['clicks', 'timestamp', 'energy', 'balance'])
+
+
+def parse_click(data):
+    """Validate a process_click payload into a ClickPayload"""
+    _check_mapping(data)
+    errors = {}
+    payload = ClickPayload(
+        clicks=_integer(data, 'clicks', errors, min_value=1, max_value=100),
+        timestamp=_datetime(data, 'timestamp', errors),
+        energy=_integer(data, 'energy', errors),
+        balance=_integer(data, 'balance', errors),
+    )
+    if errors:
+        raise PayloadError(errors)
+    return payload
+
+
+PurchasePayload = namedtuple('PurchasePayload', ['upgrade_id', 'expected_cost'])
+
+
+def parse_purchase(data):
+    """Validate a purchase_upgrade payload into a PurchasePayload"""
+    _check_mapping(data)
+    errors = {}
+    payload = PurchasePayload(
+        upgrade_id=_integer(data, 'upgrade_id', errors),
+        expected_cost=_integer(data, 'expected_cost', errors),
+    )
+    if errors:
+        raise PayloadError(errors)
+    return payload
+
+
+BulkPurchasePayload = namedtuple('BulkPurchasePayload', ['upgrade_id', 'levels'])
+
+
+def parse_bulk_purchase(data):
+    """
+    Validate a purchase_upgrade_levels payload into a BulkPurchasePayload;
+    levels is None for "max"
+    """
+    _check_mapping(data)
+    errors = {}
+    upgrade_id = _integer(data, 'upgrade_id', errors)
+    levels = None
+    if data.get('levels') != 'max':
+        levels = _integer(data, 'levels', errors, min_value=1)
+    if errors:
+        raise PayloadError(errors)
+    return BulkPurchasePayload(upgrade_id, levels)
+
+
+SyncPayload = namedtuple('SyncPayload', ['energy', 'balance'])
+
+
+def parse_sync(data):
+    """
+    Validate a sync_player_state payload into a SyncPayload; fields left
+    out are None
+    """
+    _check_mapping(data)
+    errors = {}
+    payload = SyncPayload(
+        energy=_integer(data, 'energy', errors, min_value=0, required=False),
+        balance=_integer(data, 'balance', errors, min_value=0, required=False),
+    )
+    if errors:
+        raise PayloadError(errors)
+    return payload
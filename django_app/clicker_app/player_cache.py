@@ -0,0 +1,220 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .energy import regenerated_energy
+from .models import Player
+
+
+DEFAULTS = {
+    'MAX_SIZE': 10000,
+    'TTL': 5.0,
+    # Django cache alias holding per-player version stamps shared by all
+    # processes; None keeps the cache purely per-worker (bounded by TTL)
+    'SHARED_CACHE': None,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_PLAYER_CACHE', {})}
+
+
+PLAYER_STATE_FIELDS = [
+    'id', 'user_id', 'username', 'balance', 'level', 'energy', 'max_energy',
+    'energy_regen_rate', 'coins_per_click', 'last_energy_update',
+    'last_click_seq', 'last_login', 'created_at', 'version',
+    'total_clicks', 'upgrades_purchased', 'referral_count',
+    'daily_streak_day', 'last_daily_claim_date', 'daily_rewards_claimed',
+]
+
+
+class PlayerState(namedtuple('PlayerState', PLAYER_STATE_FIELDS)):
+    """
+    Read-only copy of a player's hot fields, shaped enough like Player for
+    PlayerSerializer and the click helpers
+    """
+    __slots__ = ()
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_current_energy(self, now=None):
+        return regenerated_energy(
+            self.energy, self.max_energy, self.energy_regen_rate,
+            self.last_energy_update, now
+        )
+
+
+class PlayerStateCache:
+    """
+    Bounded LRU + TTL cache of PlayerState keyed by user id.
+
+    Every write to a player calls invalidate(), which drops the local entry
+    and, with a shared tier configured, bumps the player's version stamp in
+    that cache. Entries remember the stamp they were loaded under and are
+    reloaded as soon as another process has bumped it.
+    """
+
+    def __init__(self, max_size, ttl, shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_id):
+        """Return the PlayerState for a user, or None if there is no player"""
+        stamp = self._stamp(user_id)
+        state = self._lookup(user_id, stamp)
+        if state is not None:
+            return state
+
+        row = Player.objects.filter(user_id=user_id).values_list(*PLAYER_STATE_FIELDS).first()
+        return self._load(user_id, stamp, row)
+
+    async def aget(self, user_id):
+        """Async variant of get() for ASGI views"""
+        stamp = await self._astamp(user_id)
+        state = self._lookup(user_id, stamp)
+        if state is not None:
+            return state
+
+        row = await Player.objects.filter(user_id=user_id).values_list(*PLAYER_STATE_FIELDS).afirst()
+        return self._load(user_id, stamp, row)
+
+    def update(self, user_id, **fields):
+        """
+        Write through the result of a write whose new values are known
+        (e.g. from RETURNING), invalidating other processes' copies
+        """
+        self._replace(user_id, self._bump(user_id), fields)
+
+    async def aupdate(self, user_id, **fields):
+        self._replace(user_id, await self._abump(user_id), fields)
+
+    def invalidate(self, user_id):
+        self._bump(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    async def ainvalidate(self, user_id):
+        await self._abump(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def invalidate_many(self, user_ids):
+        for user_id in user_ids:
+            self.invalidate(user_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+    def _lookup(self, user_id, stamp):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                expires_at, entry_stamp, state = entry
+                if expires_at > now and entry_stamp == stamp:
+                    self._entries.move_to_end(user_id)
+                    self.hits += 1
+                    return state
+                del self._entries[user_id]
+            self.misses += 1
+        return None
+
+    def _load(self, user_id, stamp, row):
+        if row is None:
+            return None
+        state = PlayerState(*row)
+        self._store(user_id, stamp, state)
+        return state
+
+    def _replace(self, user_id, stamp, fields):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._store(user_id, stamp, entry[2]._replace(**fields))
+
+    def _store(self, user_id, stamp, state):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.ttl, stamp, state)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _key(self, user_id):
+        return f'clicker:player_version:{user_id}'
+
+    def _stamp(self, user_id):
+        if self.shared is None:
+            return 0
+        return self.shared.get(self._key(user_id), 0)
+
+    async def _astamp(self, user_id):
+        if self.shared is None:
+            return 0
+        return await self.shared.aget(self._key(user_id), 0)
+
+    def _bump(self, user_id):
+        if self.shared is None:
+            return 0
+        key = self._key(user_id)
+        try:
+            return self.shared.incr(key)
+        except ValueError:
+            # First write since the stamp expired or was never set
+            self.shared.add(key, 0, timeout=None)
+            return self.shared.incr(key)
+
+    async def _abump(self, user_id):
+        if self.shared is None:
+            return 0
+        key = self._key(user_id)
+        try:
+            return await self.shared.aincr(key)
+        except ValueError:
+            await self.shared.aadd(key, 0, timeout=None)
+            return await self.shared.aincr(key)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_player_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = get_config()
+            shared = caches[config['SHARED_CACHE']] if config['SHARED_CACHE'] else None
+            _cache = PlayerStateCache(config['MAX_SIZE'], config['TTL'], shared)
+    return _cache
+
+
+def reset_player_cache():
+    """Drop the cached instance, e.g. after settings change in tests"""
+    global _cache
+    with _cache_lock:
+        _cache = None
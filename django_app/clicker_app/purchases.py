@@ -0,0 +1,143 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .consumers import notify_player
+from .energy import regenerated_snapshot
+from .models import Player, PlayerUpgrade
+from .player_cache import get_player_cache
+from .stats import compute_stats, invalidate_player_stats
+from .task_progress import complete_tasks
+
+
+PLAYER_FIELDS = [field.attname for field in Player._meta.concrete_fields]
+
+# Every owned upgrade, joined onto the locked player row
+UPGRADE_FIELDS = [
+    'playerupgrade__upgrade_id', 'playerupgrade__upgrade__upgrade_type',
+    'playerupgrade__upgrade__base_effect_value', 'playerupgrade__upgrade__effect_per_level',
+    'playerupgrade__level',
+]
+
+
+class PurchaseRejected(Exception):
+    """Raised when an upgrade purchase cannot go through"""
+
+
+class CostMismatch(PurchaseRejected):
+    """Raised when the client's expected cost is not the actual cost"""
+
+    def __init__(self, actual_cost):
+        super().__init__('Cost mismatch')
+        self.actual_cost = actual_cost
+
+
+PurchaseResult = namedtuple('PurchaseResult', ['player', 'player_upgrade', 'levels', 'cost'])
+
+
+def purchase_levels(player_id, upgrade, levels=None, expected_cost=None, pending_balance=0,
+                    now=None, retries=3):
+    """
+    Buy ``levels`` levels of ``upgrade``, or with levels=None as many as
+    the balance allows, in one transaction of three statements:
+
+    1. lock the player row, reading it joined with every upgrade it owns
+    2. charge the total with an F-expression and write the stats derived
+       from the new levels (see stats.py), guarded on the version read in 1
+    3. upsert the PlayerUpgrade level
+
+    Totals come from the upgrade's prefix-summed cost table, so the work
+    does not grow with the number of levels. ``pending_balance`` is coins
+    earned through the click buffer and not yet flushed. Raises
+    PurchaseRejected (CostMismatch if ``expected_cost`` is given and is
+    not the total cost).
+    """
+    now = now or timezone.now()
+
+    for _ in range(retries):
+        with transaction.atomic():
+            rows = list(
+                Player.objects.select_for_update(of=('self',)).filter(pk=player_id)
+                .values_list(*PLAYER_FIELDS, *UPGRADE_FIELDS)
+            )
+            if not rows:
+                raise Player.DoesNotExist('Player matching query does not exist.')
+            player = Player.from_db(Player.objects.db, PLAYER_FIELDS, rows[0][:len(PLAYER_FIELDS)])
+            owned = {
+                row[len(PLAYER_FIELDS)]: row[len(PLAYER_FIELDS) + 1:]
+                for row in rows if row[len(PLAYER_FIELDS)] is not None
+            }
+            level = owned[upgrade.pk][-1] if upgrade.pk in owned else 0
+
+            if upgrade.get_cost(level) is None:
+                raise PurchaseRejected('Upgrade already at max level')
+
+            budget = player.balance + pending_balance
+            if levels is None:
+                count, cost = upgrade.get_affordable_levels(level, budget)
+                if count == 0:
+                    raise PurchaseRejected('Not enough coins')
+            else:
+                count, cost = levels, upgrade.get_cost_of_levels(level, levels)
+                if cost is None:
+                    raise PurchaseRejected(f'Only {len(upgrade.cost_table()) - level} levels left')
+
+            if expected_cost is not None and expected_cost != cost:
+                raise CostMismatch(cost)
+            if cost > budget:
+                raise PurchaseRejected('Not enough coins')
+
+            # Stats are derived from every level, including stacked multipliers
+            owned[upgrade.pk] = (
+                upgrade.upgrade_type, upgrade.base_effect_value, upgrade.effect_per_level, level + count
+            )
+            stats = compute_stats(owned.values())
+            energy, energy_updated_at = regenerated_snapshot(
+                player.energy, player.max_energy, player.energy_regen_rate, player.last_energy_update, now
+            )
+            if energy >= player.max_energy:
+                # A full energy bar stays full
+                energy = max(energy, stats.max_energy)
+
+            updated = Player.objects.filter(pk=player.pk, version=player.version).update(
+                balance=F('balance') - cost,
+                coins_per_click=stats.coins_per_click,
+                max_energy=stats.max_energy,
+                energy_regen_rate=stats.energy_regen_rate,
+                energy=energy,
+                last_energy_update=energy_updated_at,
+                upgrades_purchased=F('upgrades_purchased') + count,
+                version=F('version') + 1,
+            )
+            if not updated:
+                # Databases without row locks: someone else wrote first
+                continue
+
+            player_upgrade, = PlayerUpgrade.objects.bulk_create(
+                [PlayerUpgrade(player_id=player.pk, upgrade=upgrade, level=level + count, purchased_at=now)],
+                update_conflicts=True,
+                unique_fields=['player', 'upgrade'],
+                update_fields=['level', 'purchased_at'],
+            )
+
+        # Mirror the UPDATE on the instance read under the lock
+        player.balance -= cost
+        player.coins_per_click = stats.coins_per_click
+        player.max_energy = stats.max_energy
+        player.energy_regen_rate = stats.energy_regen_rate
+        player.energy = energy
+        player.last_energy_update = energy_updated_at
+        player.upgrades_purchased += count
+        player.version += 1
+
+        # update() and bulk_create() send no post_save: do the signals' work
+        get_player_cache().invalidate(player.user_id)
+        invalidate_player_stats(player.pk)
+        notify_player(player.user_id, 'player.changed')
+        notify_player(player.user_id, 'player.upgrade', upgrade_id=upgrade.pk, level=level + count)
+        complete_tasks([(player.pk, 'upgrades', player.upgrades_purchased - count, player.upgrades_purchased)])
+        return PurchaseResult(player, player_upgrade, count, cost)
+
+    raise PurchaseRejected('Player state changed, please retry')
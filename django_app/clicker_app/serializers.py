@@ -3,6 +3,9 @@ from .models import Player, Upgrade, PlayerUpgrade, DailyReward, PlayerDailyRewa
 
 
 class PlayerSerializer(serializers.ModelSerializer):
+    # Energy is stored as a snapshot and regenerated on read
+    energy = serializers.IntegerField(source='get_current_energy', read_only=True)
+
     class Meta:
         model = Player
         fields = [
@@ -79,4 +82,49 @@ class ClickSerializer(serializers.Serializer):
 
 class UpgradePurchaseSerializer(serializers.Serializer):
     upgrade_id = serializers.IntegerField()
-    expected_cost = serializers.IntegerField()
\ No newline at end of file
+    expected_cost = serializers.IntegerField()
+
+
+class ClickBatchSerializer(serializers.Serializer):
+    """
+    A run of taps, either as count + first/last timestamp or as a
+    delta-encoded list (first entry absolute, then gaps). Timestamps are
+    unix epoch milliseconds.
+    """
+    MAX_TAPS = 1000
+    MAX_TAPS_PER_SECOND = 20
+
+    seq = serializers.IntegerField(min_value=1)
+    count = serializers.IntegerField(min_value=1, max_value=MAX_TAPS, required=False)
+    first_ts = serializers.IntegerField(min_value=0, required=False)
+    last_ts = serializers.IntegerField(min_value=0, required=False)
+    taps = serializers.ListField(
+        child=serializers.IntegerField(min_value=0),
+        min_length=1, max_length=MAX_TAPS, required=False
+    )
+
+    def validate(self, data):
+        if 'taps' in data:
+            timestamps = []
+            current = 0
+            for delta in data['taps']:
+                current += delta
+                timestamps.append(current)
+        elif {'count', 'first_ts', 'last_ts'} <= data.keys():
+            if data['last_ts'] < data['first_ts']:
+                raise serializers.ValidationError('last_ts is before first_ts')
+            timestamps = None
+        else:
+            raise serializers.ValidationError('Either taps or count, first_ts and last_ts are required')
+
+        if timestamps is not None:
+            data['count'] = len(timestamps)
+            data['first_ts'] = timestamps[0]
+            data['last_ts'] = timestamps[-1]
+        data['timestamps'] = timestamps
+
+        # Reject runs faster than a human can tap
+        span = (data['last_ts'] - data['first_ts']) / 1000
+        if data['count'] > 1 and (data['count'] - 1) > span * self.MAX_TAPS_PER_SECOND:
+            raise serializers.ValidationError('Taps are too frequent')
+        return data
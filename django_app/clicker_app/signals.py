@@ -1,15 +1,29 @@
-from django.db.models.signals import post_save
+from django.contrib.auth.signals import user_logged_in
+from django.core.signals import request_finished
+from django.db import close_old_connections
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import Player
+from .authentication import SESSION_KEY, get_telegram_index, issue_player_token, revoke_player_tokens
+from .catalog import bump_catalog_version
+from .click_log import flush_click_log
+from .consumers import notify_player
+from .daily_rewards import flush_claim_history
+from .models import DailyReward, Player, PlayerDailyReward, PlayerTask, PlayerUpgrade, Referral, Task, Upgrade
+from .player_cache import get_player_cache
+from .stats import invalidate_player_stats
+from .task_progress import catch_up_player, complete_tasks
+from .upgrade_costs import invalidate_cost_table
 
 
 @receiver(post_save, sender=User)
 def create_player_profile(sender, instance, created, **kwargs):
     """
-    Create a player profile when a Django user is created
+    Create a player profile when a Django user is created. Code that
+    creates the player itself sets ``_skip_player_profile`` on the user.
     """
-    if created:
+    if created and not getattr(instance, '_skip_player_profile', False):
         Player.objects.create(user=instance)
 
 
@@ -18,7 +32,172 @@ def save_player_profile(sender, instance, **kwargs):
     """
     Save the player profile when the Django user is saved
     """
+    if getattr(instance, '_skip_player_profile', False):
+        return
     try:
         instance.player.save()
     except Player.DoesNotExist:
-        pass
\ No newline at end of file
+        pass
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def revoke_inactive_user_tokens(sender, instance, signal, **kwargs):
+    """
+    Revoke the player tokens of a deactivated or deleted user: token
+    authentication never loads the user to check is_active
+    """
+    if signal is post_delete or not instance.is_active:
+        revoke_player_tokens(instance.pk)
+
+
+@receiver(post_save, sender=Player)
+def invalidate_player_state(sender, instance, **kwargs):
+    """
+    Drop the cached hot state of a player whenever the row is saved
+    """
+    get_player_cache().invalidate(instance.user_id)
+
+
+
+@receiver(post_save, sender=Player)
+def catch_up_player_tasks(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Complete the tasks a full save (an admin edit of level or balance, a
+    new player) reached; the game's own writes report progress events
+    """
+    if update_fields is None and not raw:
+        catch_up_player(instance, created=created)
+
+
+@receiver(post_delete, sender=Player)
+def forget_telegram_player(sender, instance, **kwargs):
+    """
+    Drop the telegram_id -> player entry of a deleted player
+    """
+    if instance.telegram_id is not None:
+        get_telegram_index().discard(instance.telegram_id)
+
+
+@receiver(post_save, sender=Player)
+def push_player_state(sender, instance, **kwargs):
+    """
+    Push the new state to the player's open game sockets
+    """
+    notify_player(instance.user_id, 'player.changed')
+
+
+@receiver(post_save, sender=Upgrade)
+@receiver(post_delete, sender=Upgrade)
+def invalidate_upgrade_costs(sender, instance, **kwargs):
+    """
+    Drop the cached cost table of an upgrade when it is edited or deleted
+    """
+    invalidate_cost_table(instance.pk)
+
+
+@receiver(post_save, sender=Upgrade)
+@receiver(post_delete, sender=Upgrade)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=DailyReward)
+@receiver(post_delete, sender=DailyReward)
+def invalidate_catalog(sender, instance, **kwargs):
+    """
+    Make every worker rebuild its catalog snapshot when an upgrade, task
+    or daily reward is edited or deleted
+    """
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=PlayerUpgrade)
+@receiver(post_delete, sender=PlayerUpgrade)
+def invalidate_upgrade_stats(sender, instance, **kwargs):
+    """
+    Drop the cached stats record of a player whose upgrade levels changed
+    """
+    invalidate_player_stats(instance.player_id)
+
+
+@receiver(post_save, sender=PlayerUpgrade)
+def push_player_upgrade(sender, instance, **kwargs):
+    """
+    Push upgrade level changes to the player's open game sockets
+    """
+    notify_player(
+        instance.player.user_id, 'player.upgrade',
+        upgrade_id=instance.upgrade_id, level=instance.level
+    )
+
+
+@receiver(post_save, sender=PlayerTask)
+@receiver(post_delete, sender=PlayerTask)
+@receiver(post_save, sender=PlayerDailyReward)
+@receiver(post_delete, sender=PlayerDailyReward)
+def bump_player_progress(sender, instance, **kwargs):
+    """
+    Bump the version of a player whose task progress or reward claims
+    changed, so the ETags of the task and reward lists change with them
+    """
+    Player.objects.filter(pk=instance.player_id).update(version=F('version') + 1)
+    try:
+        get_player_cache().invalidate(instance.player.user_id)
+    except Player.DoesNotExist:
+        pass
+
+
+@receiver(post_save, sender=Referral)
+def count_referral(sender, instance, created, raw=False, **kwargs):
+    """
+    Count a new referral towards the referrer's referral tasks
+    """
+    if not created or raw:
+        return
+    Player.objects.filter(pk=instance.referrer_id).update(
+        referral_count=F('referral_count') + 1, version=F('version') + 1
+    )
+    user_id, count = Player.objects.filter(pk=instance.referrer_id).values_list(
+        'user_id', 'referral_count'
+    ).get()
+    get_player_cache().invalidate(user_id)
+    complete_tasks([(instance.referrer_id, 'referrals', count - 1, count)])
+
+
+@receiver(user_logged_in)
+def issue_session_player_token(sender, request, user, **kwargs):
+    """
+    Issue a player token at login so the game page can call the API
+    without session lookups
+    """
+    if request is None or not hasattr(request, 'session'):
+        return
+    try:
+        request.session[SESSION_KEY] = issue_player_token(user)[0]
+    except Player.DoesNotExist:
+        pass
+
+
+def write_click_log(sender, **kwargs):
+    """
+    Write buffered click events once they are due, after the response has
+    been sent
+    """
+    flush_click_log()
+
+
+def write_claim_history(sender, **kwargs):
+    """
+    Write buffered daily reward claims once they are due, after the
+    response has been sent
+    """
+    flush_claim_history()
+
+
+# Receivers run in the order they were connected, and Django connects
+# close_old_connections first: move it behind the buffer flushes so they
+# reuse the request's connection instead of opening one that is left
+# open after the request
+request_finished.disconnect(close_old_connections)
+request_finished.connect(write_click_log)
+request_finished.connect(write_claim_history)
+request_finished.connect(close_old_connections)
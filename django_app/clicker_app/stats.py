@@ -0,0 +1,154 @@
+from collections import namedtuple
+from fractions import Fraction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+
+from .models import Player, PlayerUpgrade
+from .player_cache import get_player_cache
+from .upgrade_costs import effect_of_levels
+
+
+# A player's coins_per_click, max_energy and energy_regen_rate are a pure
+# function of their upgrade levels:
+#
+#   coins_per_click   = floor((base + coins_per_click effects) * multiplier)
+#   max_energy        = base + max_energy effects
+#   energy_regen_rate = base + energy_regen effects
+#
+# where each upgrade's effect is the closed-form sum over its levels and
+# every 'multiplier' upgrade adds its effect in percent, stacking
+# multiplicatively with the others: two +50% upgrades give x2.25. The
+# results are materialized on Player (clicks read them in SQL) and
+# rewritten on purchase; recompute_player_stats() rebuilds them after a
+# catalog rebalance.
+
+DEFAULTS = {
+    'CACHE': 'default',  # CACHES alias holding computed stat records
+    'TIMEOUT': 60 * 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_PLAYER_STATS', {})}
+
+
+PlayerStats = namedtuple('PlayerStats', ['coins_per_click', 'max_energy', 'energy_regen_rate', 'click_multiplier'])
+
+STAT_FIELDS = ['coins_per_click', 'max_energy', 'energy_regen_rate']
+
+# Player field raised by each additive upgrade type
+EFFECT_FIELDS = {
+    'coins_per_click': 'coins_per_click',
+    'max_energy': 'max_energy',
+    'energy_regen': 'energy_regen_rate',
+}
+
+# (upgrade_type, base_effect_value, effect_per_level, level) of an owned upgrade
+LEVEL_FIELDS = ['upgrade__upgrade_type', 'upgrade__base_effect_value', 'upgrade__effect_per_level', 'level']
+
+
+def base_stats():
+    return {name: Player._meta.get_field(name).default for name in STAT_FIELDS}
+
+
+def compute_stats(levels):
+    """
+    Effective stats from an iterable of (upgrade_type, base_effect_value,
+    effect_per_level, level) tuples
+    """
+    totals = base_stats()
+    multiplier = Fraction(1)
+    for upgrade_type, base_effect_value, effect_per_level, level in levels:
+        if level <= 0:
+            continue
+        effect = effect_of_levels(base_effect_value, effect_per_level, 0, level)
+        if upgrade_type == 'multiplier':
+            multiplier *= Fraction(100 + effect, 100)
+        elif upgrade_type in EFFECT_FIELDS:
+            totals[EFFECT_FIELDS[upgrade_type]] += effect
+
+    coins_per_click = totals['coins_per_click'] * multiplier
+    return PlayerStats(
+        coins_per_click.numerator // coins_per_click.denominator,
+        totals['max_energy'],
+        totals['energy_regen_rate'],
+        round(float(multiplier), 4),
+    )
+
+
+def load_levels(player_ids):
+    """Return {player id: [level tuple, ...]} for ``player_ids`` in one query"""
+    levels = {player_id: [] for player_id in player_ids}
+    rows = PlayerUpgrade.objects.filter(player_id__in=player_ids, level__gt=0).values_list(
+        'player_id', *LEVEL_FIELDS
+    )
+    for player_id, *level in rows:
+        levels[player_id].append(tuple(level))
+    return levels
+
+
+def _key(player_id):
+    return f'clicker:player_stats:{player_id}'
+
+
+def get_player_stats(player_id):
+    """The cached PlayerStats record of a player, computed on a miss"""
+    config = get_config()
+    cache = caches[config['CACHE']]
+    record = cache.get(_key(player_id))
+    if record is None:
+        record = tuple(compute_stats(load_levels([player_id])[player_id]))
+        cache.set(_key(player_id), record, timeout=config['TIMEOUT'])
+    return PlayerStats(*record)
+
+
+def invalidate_player_stats(*player_ids):
+    caches[get_config()['CACHE']].delete_many([_key(player_id) for player_id in player_ids])
+
+
+def recompute_player_stats(chunk_size=1000):
+    """
+    Rewrite the materialized stats of every player whose stored values
+    differ from their upgrade levels, walking players in id-ordered chunks
+    with two reads and at most one bulk UPDATE per chunk. Each chunk locks
+    its player rows first, as purchase_levels() does, so a purchase cannot
+    change levels between the read and the write. Returns (players
+    checked, players updated).
+    """
+    checked = updated = 0
+    last_id = 0
+    player_cache = get_player_cache()
+
+    while True:
+        with transaction.atomic():
+            players = list(
+                Player.objects.select_for_update().filter(pk__gt=last_id).order_by('pk')
+                .only('pk', 'user_id', *STAT_FIELDS)[:chunk_size]
+            )
+            if not players:
+                break
+            last_id = players[-1].pk
+            checked += len(players)
+
+            levels = load_levels([player.pk for player in players])
+            changed = []
+            for player in players:
+                stats = compute_stats(levels[player.pk])
+                if any(getattr(player, name) != getattr(stats, name) for name in STAT_FIELDS):
+                    for name in STAT_FIELDS:
+                        setattr(player, name, getattr(stats, name))
+                    player.version = F('version') + 1
+                    changed.append(player)
+
+            if changed:
+                Player.objects.bulk_update(changed, STAT_FIELDS + ['version'])
+
+        if changed:
+            player_cache.invalidate_many([player.user_id for player in changed])
+            updated += len(changed)
+        invalidate_player_stats(*[player.pk for player in players])
+
+    return checked, updated
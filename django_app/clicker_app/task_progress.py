@@ -0,0 +1,116 @@
+from django.db.models import F
+
+from .catalog import get_catalog
+from .models import Player
+from .player_cache import get_player_cache
+from .task_state import get_task_store
+
+
+# Task progress is event driven. Every task type reads one per-player
+# counter, kept up to date by the write that changes it (the click UPDATE
+# adds to total_clicks, a purchase to upgrades_purchased, and so on), so
+# the progress of a task in flight is simply its counter. The write path
+# reports (player_id, task_type, old value, new value) events; targets
+# crossed between the two values are found by bisecting the catalog's
+# per-type threshold index and recorded as completed in the task state
+# store (see task_state.py) with one upsert per batch of events. An event
+# that crosses no target, the common case, costs two binary searches and
+# no query.
+#
+# The writes reporting events already bump Player.version, which keeps
+# the task list ETags in step without another write here.
+
+# Player field counting towards each task type
+COUNTER_FIELDS = {
+    'clicks': 'total_clicks',
+    'upgrades': 'upgrades_purchased',
+    'referrals': 'referral_count',
+    'level': 'level',
+    'balance': 'balance',
+}
+
+
+def task_counter(player, task):
+    """Current value of the counter ``task`` is measured against"""
+    field = COUNTER_FIELDS.get(task.task_type)
+    return getattr(player, field) if field else 0
+
+
+def crossed_tasks(task_type, old, new, catalog=None):
+    """
+    Active tasks of ``task_type`` whose target lies in (old, new], found
+    by bisecting the catalog's threshold index
+    """
+    index = (catalog or get_catalog()).task_thresholds.get(task_type)
+    return index.crossed(old, new) if index is not None else ()
+
+
+def complete_tasks(events):
+    """
+    Record the tasks completed by ``events``, an iterable of (player_id,
+    task_type, old value, new value). Runs no query unless a target was
+    crossed. Returns the (player_id, task, progress) completions.
+    """
+    catalog = get_catalog()
+    rows = {}
+    for player_id, task_type, old, new in events:
+        for task in crossed_tasks(task_type, old, new, catalog):
+            rows[player_id, task.pk] = (player_id, task, new)
+    rows = list(rows.values())
+    get_task_store().complete(rows)
+    return rows
+
+
+def catch_up_player(player, created=False):
+    """
+    Complete every task whose target ``player``'s counters already reached,
+    e.g. after an admin edit. A new player has no rows to read first.
+    """
+    store = get_task_store()
+    completed = set() if created else store.completed_ids([player.pk])[player.pk]
+    rows = []
+    for task_type, index in get_catalog().task_thresholds.items():
+        field = COUNTER_FIELDS.get(task_type)
+        if field is None:
+            continue
+        value = getattr(player, field)
+        rows.extend((player.pk, task, value) for task in index.reached(value) if task.pk not in completed)
+    store.complete(rows)
+    return rows
+
+
+def catch_up_tasks(chunk_size=1000):
+    """
+    Complete tasks for every player whose counter is past the target but
+    who has no completed row, e.g. for tasks added after players got
+    there. One set-based pass per active task, in id-ordered chunks.
+    Returns the number of rows written.
+    """
+    store = get_task_store()
+    player_cache = get_player_cache()
+    written = 0
+    for task in get_catalog().tasks:
+        field = COUNTER_FIELDS.get(task.task_type)
+        if field is None:
+            continue
+        players = store.without_completion(Player.objects.filter(**{f'{field}__gte': task.target_value}), task)
+        last_id = 0
+        while True:
+            chunk = list(
+                players.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'user_id', field)[:chunk_size]
+            )
+            if not chunk:
+                break
+            last_id = chunk[-1][0]
+            completed = store.completed_ids([player_id for player_id, _, _ in chunk])
+            chunk = [row for row in chunk if task.pk not in completed[row[0]]]
+            if not chunk:
+                continue
+            store.complete([(player_id, task, value) for player_id, _, value in chunk])
+            written += len(chunk)
+            # No event write bumped these players: do it for their ETags
+            Player.objects.filter(pk__in=[player_id for player_id, _, _ in chunk]).update(
+                version=F('version') + 1
+            )
+            player_cache.invalidate_many([user_id for _, user_id, _ in chunk])
+    return written
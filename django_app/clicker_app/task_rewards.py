@@ -0,0 +1,118 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .consumers import notify_player
+from .models import Player
+from .player_cache import get_player_cache
+from .task_progress import complete_tasks, task_counter
+from .task_state import TaskClaimRejected, get_task_store
+
+
+ClaimResult = namedtuple('ClaimResult', ['player', 'tasks', 'counters', 'coins', 'energy', 'claimed_at'])
+TaskClaim = namedtuple('TaskClaim', ['player', 'state', 'counter'])
+
+
+def claim_one_task_reward(player_id, task, now=None, retries=3):
+    """
+    Claim the reward of one task: mark it claimed in the task store and
+    credit its coins and energy with a conditional UPDATE guarded on the
+    version of the player row read in the same transaction, adding the
+    coins with F() so clicks settled meanwhile are kept. A lost race rolls
+    back, claim included, and retries. Raises TaskClaimRejected.
+    """
+    now = now or timezone.now()
+    store = get_task_store()
+
+    for _ in range(retries):
+        with transaction.atomic():
+            player = Player.objects.get(pk=player_id)
+            counter = task_counter(player, task)
+            state = store.claim(player.pk, task, counter, now)
+
+            player.snapshot_energy(now)
+            player.energy = min(player.energy + task.reward_energy, player.max_energy)
+            updated = Player.objects.filter(pk=player.pk, version=player.version).update(
+                balance=F('balance') + task.reward_coins,
+                energy=player.energy,
+                last_energy_update=player.last_energy_update,
+                version=F('version') + 1,
+            )
+            if not updated:
+                # The player was written since it was read
+                transaction.set_rollback(True)
+                continue
+
+        # Mirror the UPDATE on the instance read above
+        player.balance += task.reward_coins
+        player.version += 1
+
+        # update() sends no post_save: do the signals' work
+        get_player_cache().invalidate(player.user_id)
+        notify_player(player.user_id, 'player.changed')
+        complete_tasks([(player.pk, 'balance', player.balance - task.reward_coins, player.balance)])
+        return TaskClaim(player, state, counter)
+
+    raise TaskClaimRejected('Player state changed, please retry')
+
+
+def claim_task_rewards(player_id, now=None, retries=3):
+    """
+    Claim the reward of every completed, unclaimed task in one transaction
+    of a fixed number of statements whatever the number of tasks:
+
+    1. read the player row
+    2. read its task state and mark the ready tasks claimed in one
+       statement (see task_state.py), after recording completions only
+       the counters knew about
+    3. credit the summed coins and energy with a conditional UPDATE
+       guarded on the version read in 1
+
+    A claim racing another claim or player write rolls back and retries.
+    Claiming again finds nothing ready and changes nothing. Raises
+    TaskClaimRejected after ``retries`` lost races.
+    """
+    now = now or timezone.now()
+    store = get_task_store()
+    tasks = get_catalog().tasks
+
+    for _ in range(retries):
+        with transaction.atomic():
+            player = Player.objects.get(pk=player_id)
+            counters = {task.pk: task_counter(player, task) for task in tasks}
+            claimed = store.claim_all(player.pk, tasks, counters, now)
+            if claimed is None:
+                transaction.set_rollback(True)
+                continue
+            if not claimed:
+                return ClaimResult(player, [], counters, 0, 0, None)
+
+            coins = sum(task.reward_coins for task in claimed)
+            energy = sum(task.reward_energy for task in claimed)
+            player.snapshot_energy(now)
+            player.energy = min(player.energy + energy, player.max_energy)
+            updated = Player.objects.filter(pk=player.pk, version=player.version).update(
+                balance=F('balance') + coins,
+                energy=player.energy,
+                last_energy_update=player.last_energy_update,
+                version=F('version') + 1,
+            )
+            if not updated:
+                # The player was written since it was read
+                transaction.set_rollback(True)
+                continue
+
+        # Mirror the UPDATE on the instance read in 1
+        player.balance += coins
+        player.version += 1
+
+        # update() sends no post_save: do the signals' work
+        get_player_cache().invalidate(player.user_id)
+        notify_player(player.user_id, 'player.changed')
+        complete_tasks([(player.pk, 'balance', player.balance - coins, player.balance)])
+        return ClaimResult(player, claimed, counters, coins, energy, now)
+
+    raise TaskClaimRejected('Player state changed, please retry')
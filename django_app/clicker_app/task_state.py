@@ -0,0 +1,317 @@
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import PlayerTask, PlayerTaskState
+
+
+DEFAULTS = {
+    # 'rows' keeps one PlayerTask row per (player, task); 'bitmap' keeps the
+    # completed and claimed flags of all tasks on one PlayerTaskState row
+    'STORAGE': 'rows',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CLICKER_TASK_STATE', {})}
+
+
+# What the task endpoints need to know about a task of a player. ``id`` is
+# the PlayerTask id (None in bitmap mode), ``progress`` None when only the
+# counter knows it and ``completed_at`` the time the reward was claimed.
+TaskState = namedtuple('TaskState', ['id', 'progress', 'is_completed', 'completed_at'])
+
+
+class TaskClaimRejected(Exception):
+    """Raised when a task reward cannot be claimed"""
+
+
+def _bits(data):
+    return int.from_bytes(bytes(data or b''), 'little')
+
+
+def _bytes(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+class RowTaskStore:
+    """One PlayerTask row per player and task"""
+
+    def complete(self, rows):
+        """Record (player_id, task, progress) completions in one upsert"""
+        if rows:
+            PlayerTask.objects.bulk_create(
+                [
+                    PlayerTask(player_id=player_id, task=task, progress=progress, is_completed=True)
+                    for player_id, task, progress in rows
+                ],
+                update_conflicts=True,
+                unique_fields=['player', 'task'],
+                # A claimed reward stays claimed
+                update_fields=['progress', 'is_completed'],
+            )
+
+    def completed_ids(self, player_ids):
+        """{player id: set of completed task ids}"""
+        completed = defaultdict(set)
+        rows = PlayerTask.objects.filter(player_id__in=player_ids, is_completed=True).values_list(
+            'player_id', 'task_id'
+        )
+        for player_id, task_id in rows:
+            completed[player_id].add(task_id)
+        return completed
+
+    def without_completion(self, players, task):
+        """Narrow a Player queryset to players who have not completed ``task``"""
+        return players.exclude(
+            pk__in=PlayerTask.objects.filter(task=task, is_completed=True).values('player_id')
+        )
+
+    def states(self, player_id, tasks):
+        return {
+            player_task.task_id: TaskState(
+                player_task.id, player_task.progress, player_task.is_completed, player_task.completed_at
+            )
+            for player_task in PlayerTask.objects.filter(player_id=player_id, task__in=tasks)
+        }
+
+    def claim(self, player_id, task, counter, now=None):
+        """
+        Mark the reward of ``task`` claimed; the conditional UPDATE lets a
+        reward be claimed only once. Raises TaskClaimRejected.
+        """
+        now = now or timezone.now()
+        # No save(): its signal would bump the player version that
+        # claims are guarded on (the claim bumps it itself)
+        PlayerTask.objects.bulk_create(
+            [PlayerTask(player_id=player_id, task=task, progress=0, is_completed=False)],
+            ignore_conflicts=True,
+        )
+        player_task = PlayerTask.objects.get(player_id=player_id, task=task)
+        # The counter may have reached the target before a completion was recorded
+        if not player_task.is_completed and counter < task.target_value:
+            raise TaskClaimRejected('Task not completed')
+        if player_task.completed_at is not None:
+            raise TaskClaimRejected('Reward already claimed')
+
+        progress = player_task.progress if player_task.is_completed else counter
+        claimed = PlayerTask.objects.filter(pk=player_task.pk, completed_at__isnull=True).update(
+            progress=progress, is_completed=True, completed_at=now
+        )
+        if not claimed:
+            raise TaskClaimRejected('Reward already claimed')
+        return TaskState(player_task.id, progress, True, now)
+
+    def claim_all(self, player_id, tasks, counters, now=None):
+        """
+        Mark every completed, unclaimed task among ``tasks`` claimed, in one
+        UPDATE guarded on completed_at. ``counters`` maps task ids to the
+        player's counter for them. Returns the claimed tasks, or None if a
+        concurrent claim took one of them and the transaction must roll back.
+        """
+        now = now or timezone.now()
+        states = self.states(player_id, tasks)
+        ready, missing = [], []
+        for task in tasks:
+            state = states.get(task.pk)
+            if state is not None and state.completed_at is not None:
+                continue
+            if state is not None and state.is_completed:
+                ready.append(task)
+            elif counters[task.pk] >= task.target_value:
+                ready.append(task)
+                missing.append((player_id, task, counters[task.pk]))
+        if not ready:
+            return []
+
+        self.complete(missing)
+        claimed = PlayerTask.objects.filter(
+            player_id=player_id, task__in=ready, completed_at__isnull=True
+        ).update(completed_at=now)
+        return ready if claimed == len(ready) else None
+
+
+class BitmapTaskStore:
+    """
+    Completed and claimed bitsets on one PlayerTaskState row per player,
+    indexed by Task.slot.
+
+    Completions are read-modify-written in batches, so a race can drop a
+    completion bit; the counters still hold the progress, claims accept a
+    counter past the target and update_task_progress restores the bit.
+    Claims are compare-and-swap on the claimed bitset and never race.
+    """
+
+    def complete(self, rows):
+        masks = defaultdict(int)
+        for player_id, task, _ in rows:
+            masks[player_id] |= 1 << task.slot
+        if not masks:
+            return
+
+        existing = dict(
+            PlayerTaskState.objects.filter(player_id__in=masks).values_list('player_id', 'completed')
+        )
+        PlayerTaskState.objects.bulk_create(
+            [
+                PlayerTaskState(player_id=player_id, completed=_bytes(_bits(existing.get(player_id)) | mask))
+                for player_id, mask in masks.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['player'],
+            update_fields=['completed'],
+        )
+
+    def completed_ids(self, player_ids):
+        # Bits of inactive tasks have no task in the catalog and are skipped
+        tasks_by_slot = get_catalog().tasks_by_slot
+        completed = defaultdict(set)
+        rows = PlayerTaskState.objects.filter(player_id__in=player_ids).values_list('player_id', 'completed')
+        for player_id, data in rows:
+            bits = _bits(data)
+            while bits:
+                low = bits & -bits
+                task = tasks_by_slot.get(low.bit_length() - 1)
+                if task is not None:
+                    completed[player_id].add(task.pk)
+                bits ^= low
+        return completed
+
+    def without_completion(self, players, task):
+        # Bits cannot be filtered on in SQL: callers check completed_ids()
+        return players
+
+    def states(self, player_id, tasks):
+        row = PlayerTaskState.objects.filter(player_id=player_id).values_list(
+            'completed', 'claimed', 'claimed_at'
+        ).first()
+        if row is None:
+            return {}
+        completed, claimed, claimed_at = _bits(row[0]), _bits(row[1]), row[2]
+        return {
+            task.pk: TaskState(None, None, True, claimed_at if claimed >> task.slot & 1 else None)
+            for task in tasks if (completed | claimed) >> task.slot & 1
+        }
+
+    def claim(self, player_id, task, counter, now=None, retries=3):
+        now = now or timezone.now()
+        bit = 1 << task.slot
+        for _ in range(retries):
+            row = PlayerTaskState.objects.filter(player_id=player_id).values_list('completed', 'claimed').first()
+            completed, claimed = (_bits(row[0]), _bits(row[1])) if row else (0, 0)
+            if claimed & bit:
+                raise TaskClaimRejected('Reward already claimed')
+            if not completed & bit and counter < task.target_value:
+                raise TaskClaimRejected('Task not completed')
+
+            fields = {
+                'completed': _bytes(completed | bit),
+                'claimed': _bytes(claimed | bit),
+                'claimed_at': now,
+            }
+            if row is None:
+                try:
+                    with transaction.atomic():
+                        PlayerTaskState.objects.create(player_id=player_id, **fields)
+                except IntegrityError:
+                    continue
+            elif not PlayerTaskState.objects.filter(player_id=player_id, claimed=bytes(row[1])).update(**fields):
+                # Another claim of this player landed first
+                continue
+            return TaskState(None, max(counter, task.target_value), True, now)
+        raise TaskClaimRejected('Task state changed, please retry')
+
+    def claim_all(self, player_id, tasks, counters, now=None):
+        now = now or timezone.now()
+        row = PlayerTaskState.objects.filter(player_id=player_id).values_list('completed', 'claimed').first()
+        completed, claimed = (_bits(row[0]), _bits(row[1])) if row else (0, 0)
+        ready = [
+            task for task in tasks
+            if not claimed >> task.slot & 1
+            and (completed >> task.slot & 1 or counters[task.pk] >= task.target_value)
+        ]
+        if not ready:
+            return []
+
+        mask = sum(1 << task.slot for task in ready)
+        fields = {'completed': _bytes(completed | mask), 'claimed': _bytes(claimed | mask), 'claimed_at': now}
+        if row is None:
+            try:
+                with transaction.atomic():
+                    PlayerTaskState.objects.create(player_id=player_id, **fields)
+            except IntegrityError:
+                return None
+        elif not PlayerTaskState.objects.filter(player_id=player_id, claimed=bytes(row[1])).update(**fields):
+            return None
+        return ready
+
+
+def backfill_bitmaps(chunk_size=1000):
+    """
+    Fold completed and claimed PlayerTask rows into PlayerTaskState
+    bitsets, merged with bits already set, in player id-ordered chunks.
+    Returns (players, rows) processed.
+    """
+    rows = PlayerTask.objects.filter(is_completed=True)
+    players = total = 0
+    last_id = 0
+    while True:
+        player_ids = list(
+            rows.filter(player_id__gt=last_id).order_by('player_id')
+            .values_list('player_id', flat=True).distinct()[:chunk_size]
+        )
+        if not player_ids:
+            break
+        last_id = player_ids[-1]
+
+        completed, claimed = defaultdict(int), defaultdict(int)
+        for player_id, slot, completed_at in rows.filter(player_id__in=player_ids).values_list(
+            'player_id', 'task__slot', 'completed_at'
+        ):
+            completed[player_id] |= 1 << slot
+            if completed_at is not None:
+                claimed[player_id] |= 1 << slot
+            total += 1
+        claimed_at = dict(
+            rows.filter(player_id__in=player_ids, completed_at__isnull=False)
+            .values('player_id').annotate(latest=Max('completed_at')).values_list('player_id', 'latest')
+        )
+        existing = {
+            player_id: (_bits(done), _bits(taken), at)
+            for player_id, done, taken, at in PlayerTaskState.objects.filter(player_id__in=player_ids)
+            .values_list('player_id', 'completed', 'claimed', 'claimed_at')
+        }
+
+        states = []
+        for player_id in player_ids:
+            done, taken, at = existing.get(player_id, (0, 0, None))
+            latest = max(filter(None, [at, claimed_at.get(player_id)]), default=None)
+            states.append(PlayerTaskState(
+                player_id=player_id,
+                completed=_bytes(done | completed[player_id]),
+                claimed=_bytes(taken | claimed[player_id]),
+                claimed_at=latest,
+            ))
+        PlayerTaskState.objects.bulk_create(
+            states,
+            update_conflicts=True,
+            unique_fields=['player'],
+            update_fields=['completed', 'claimed', 'claimed_at'],
+        )
+        players += len(states)
+    return players, total
+
+
+STORES = {
+    'rows': RowTaskStore,
+    'bitmap': BitmapTaskStore,
+}
+
+
+def get_task_store():
+    """The configured task state store"""
+    return STORES[get_config()['STORAGE']]()
@@ -1,43 +1,104 @@
+import time
+
 from celery import shared_task
 from django.utils import timezone
 from django.db.models import F
 from .models import Player
+from .energy import current_energy, energy_updated_at
+from .click_buffer import flush_click_buffer
+from .click_log import maintain_click_log
+from .daily_rewards import compact_claim_history
+from .task_progress import catch_up_tasks
 from datetime import timedelta
 
 
 @shared_task
-def regenerate_energy():
+def regenerate_energy(chunk_size=1000):
     """
-    Regenerate energy for active players
-    This task should be run periodically (e.g., every 30 seconds)
+    Fold regenerated energy into the stored snapshot of active players
+    Energy is computed on read, so this only matters to code that still reads
+    the raw Player.energy column; it is no longer scheduled by default.
+    Players are walked in keyset-paginated id ranges, one UPDATE per chunk.
     """
-    # Get players who were active recently (last 10 minutes)
+    started = time.monotonic()
+    now = timezone.now()
+
+    # Players who were active recently (last 10 minutes) and are not full yet
     active_players = Player.objects.filter(
-        last_energy_update__gte=timezone.now() - timedelta(minutes=10)
+        last_energy_update__gte=now - timedelta(minutes=10),
+        energy__lt=F('max_energy')
     )
-    
+
     updated_count = 0
-    
-    for player in active_players:
-        # Calculate seconds since last energy update
-        seconds_since_update = (timezone.now() - player.last_energy_update).total_seconds()
-        
-        # Calculate energy to regenerate
-        energy_to_regenerate = int(seconds_since_update * player.energy_regen_rate)
-        
-        # Only update if there's energy to regenerate
-        if energy_to_regenerate > 0:
-            # Update energy (but don't exceed max_energy)
-            new_energy = min(player.max_energy, player.energy + energy_to_regenerate)
-            
-            # Only update if energy actually changed
-            if new_energy != player.energy:
-                player.energy = new_energy
-                player.last_energy_update = timezone.now()
-                player.save()
-                updated_count += 1
-    
-    return f"Updated energy for {updated_count} players"
+    chunk_durations = []
+    last_id = 0
+
+    while True:
+        # The id that closes this chunk; None means the rest fits in one chunk
+        boundary = active_players.filter(id__gt=last_id).order_by('id').values_list(
+            'id', flat=True
+        )[chunk_size - 1:chunk_size].first()
+
+        chunk = active_players.filter(id__gt=last_id)
+        if boundary is not None:
+            chunk = chunk.filter(id__lte=boundary)
+
+        chunk_started = time.monotonic()
+        updated_count += chunk.alias(
+            regenerated=current_energy(now)
+        ).filter(
+            regenerated__gt=F('energy')
+        ).update(
+            energy=current_energy(now),
+            last_energy_update=energy_updated_at(now)
+        )
+        chunk_durations.append(time.monotonic() - chunk_started)
+
+        if boundary is None:
+            break
+        last_id = boundary
+
+    return {
+        'updated': updated_count,
+        'chunks': len(chunk_durations),
+        'chunk_size': chunk_size,
+        'duration_ms': round((time.monotonic() - started) * 1000, 2),
+        'max_chunk_ms': round(max(chunk_durations) * 1000, 2),
+        'avg_chunk_ms': round(sum(chunk_durations) / len(chunk_durations) * 1000, 2),
+    }
+
+
+@shared_task
+def flush_clicks():
+    """
+    Write buffered clicks to the database (with the 'shards' backend this
+    compacts the counter shards back into Player)
+    This task should be run frequently (e.g., every 500 ms)
+    """
+    updated_count = flush_click_buffer()
+    return f"Flushed buffered clicks for {updated_count} players"
+
+
+@shared_task
+def maintain_click_events():
+    """
+    Create the upcoming daily click event partitions and drop the ones
+    past CLICKER_CLICK_LOG['RETENTION_DAYS']
+    This task should be run daily
+    """
+    removed = maintain_click_log()
+    return f"Removed {removed} expired click event partitions"
+
+
+@shared_task
+def compact_daily_reward_history(chunk_size=1000):
+    """
+    Fold daily reward claims older than CLICKER_DAILY_REWARDS['RETENTION_DAYS']
+    into monthly per-player summaries
+    This task should be run daily
+    """
+    compacted = compact_claim_history(chunk_size=chunk_size)
+    return f"Compacted {compacted} daily reward claims"
 
 
 @shared_task
@@ -57,8 +118,8 @@ def update_leaderboard():
     Update leaderboard cache
     This task should be run periodically (e.g., every 10 minutes)
     """
-    # Get top 100 players by balance
-    top_players = Player.objects.order_by('-balance')[:100]
+    # Get top 100 players by balance, including uncompacted counter shards
+    top_players = Player.objects.with_total_balance().order_by('-total_balance')[:100]
     
     # In a real implementation, you would cache this data
     # For example, using Redis:
@@ -68,7 +129,7 @@ def update_leaderboard():
     #     {
     #         'id': player.id,
     #         'username': player.username,
-    #         'balance': player.balance,
+    #         'balance': player.total_balance,
     #         'level': player.level
     #     } for player in top_players
     # ]
@@ -78,43 +139,12 @@ def update_leaderboard():
 
 
 @shared_task
-def update_task_progress():
+def update_task_progress(chunk_size=1000):
     """
-    Update player task progress
+    Catch up task completions the write paths could not see, e.g. tasks
+    added after players already passed their target. Progress itself is
+    reported by the click, purchase, referral and balance writes.
     This task should be run periodically (e.g., every hour)
     """
-    # This would update task progress for all players
-    # For example, counting total clicks, upgrades purchased, etc.
-    
-    # Example: Update click-based tasks
-    # This is a simplified example - in practice you'd want to track clicks
-    # in a separate model to avoid recalculating from scratch
-    
-    updated_tasks = 0
-    
-    # Get all click-based tasks
-    # click_tasks = Task.objects.filter(task_type='clicks')
-    
-    # for task in click_tasks:
-    #     # Update progress for all players
-    #     for player in Player.objects.all():
-    #         # Get player's total clicks (this would need to be tracked)
-    #         total_clicks = player.total_clicks or 0
-    #         
-    #         # Update task progress
-    #         player_task, created = PlayerTask.objects.get_or_create(
-    #             player=player, task=task,
-    #             defaults={'progress': 0, 'is_completed': False}
-    #         )
-    #         
-    #         if not player_task.is_completed and total_clicks >= task.target_value:
-    #             player_task.progress = total_clicks
-    #             player_task.is_completed = True
-    #             player_task.save()
-    #             updated_tasks += 1
-    #         elif player_task.progress != total_clicks:
-    #             player_task.progress = total_clicks
-    #             player_task.save()
-    #             updated_tasks += 1
-    
+    updated_tasks = catch_up_tasks(chunk_size)
     return f"Updated progress for {updated_tasks} tasks"
\ No newline at end of file
@@ -0,0 +1,90 @@
+import threading
+from array import array
+from bisect import bisect_right
+from fractions import Fraction
+from itertools import accumulate
+
+
+# Exact upgrade cost curves. The cost of buying level n + 1 is
+# floor(base_cost * cost_multiplier ** n) where the multiplier is taken as
+# the decimal the admin typed (1.15, not the nearest binary float), so
+# costs do not drift with float rounding at high levels. Each upgrade's
+# curve is built once per process as an array of signed 64-bit integers;
+# levels whose cost would not fit a BigIntegerField balance are left out
+# and cannot be bought. Alongside the table a prefix sum is kept, so the
+# price of buying any run of levels is one subtraction and the number of
+# levels a balance affords is one binary search.
+
+MAX_COST = 2 ** 63 - 1
+
+
+def build_cost_table(base_cost, cost_multiplier, max_level):
+    """Return array('q') of the cost of each level from 0 to max_level - 1"""
+    multiplier = Fraction(str(cost_multiplier))
+    cost = Fraction(base_cost)
+    table = array('q')
+    for _ in range(max(max_level, 0)):
+        value = cost.numerator // cost.denominator
+        if not 0 <= value <= MAX_COST:
+            break
+        table.append(value)
+        cost *= multiplier
+    return table
+
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def _entry(upgrade):
+    key = (upgrade.base_cost, upgrade.cost_multiplier, upgrade.max_level)
+    entry = _tables.get(upgrade.pk)
+    if entry is not None and entry[0] == key:
+        return entry
+
+    table = build_cost_table(*key)
+    # Totals can exceed 64 bits, so prefix sums stay Python ints
+    entry = (key, table, list(accumulate(table, initial=0)))
+    with _tables_lock:
+        _tables[upgrade.pk] = entry
+    return entry
+
+
+def get_cost_table(upgrade):
+    """
+    Return the cached cost table of ``upgrade``. Tables are keyed by the
+    fields they are built from, so an instance with edited fields never
+    gets a stale table even before invalidation reaches this process.
+    """
+    return _entry(upgrade)[1]
+
+
+def get_cost_prefix(upgrade):
+    """prefix[n] is the total cost of levels 0 .. n - 1 of ``upgrade``"""
+    return _entry(upgrade)[2]
+
+
+def affordable_levels(prefix, level, budget):
+    """How many levels past ``level`` a ``budget`` pays for"""
+    if level >= len(prefix) - 1:
+        return 0
+    return bisect_right(prefix, prefix[level] + budget) - 1 - level
+
+
+def effect_of_levels(base_effect_value, effect_per_level, current_level, levels):
+    """
+    Combined effect of levels current_level + 1 .. current_level + levels:
+    level k adds base_effect_value + effect_per_level * (k - 1)
+    """
+    return levels * base_effect_value + effect_per_level * (
+        levels * current_level + levels * (levels - 1) // 2
+    )
+
+
+def invalidate_cost_table(upgrade_id=None):
+    """Forget one upgrade's table, or every table"""
+    with _tables_lock:
+        if upgrade_id is None:
+            _tables.clear()
+        else:
+            _tables.pop(upgrade_id, None)
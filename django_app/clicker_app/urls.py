@@ -10,6 +10,7 @@ urlpatterns = [
     path('upgrades/', views.upgrades, name='upgrades'),
     path('daily-reward/', views.daily_reward, name='daily_reward'),
     path('click/', views.process_click, name='click'),
+    path('v2/click/batch/', views.process_click_batch, name='click_batch'),
     
     # Authentication URLs
     path('login/', auth_views.LoginView.as_view(template_name='clicker/login.html'), name='login'),
@@ -1,19 +1,37 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
+from django.http import HttpResponse
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes, authentication_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.authentication import SessionAuthentication, BasicAuthentication
 from rest_framework.response import Response
+from rest_framework.exceptions import AuthenticationFailed
 from django.utils import timezone
 from django.db.models import F
-from .models import Player, Upgrade, PlayerUpgrade, DailyReward, PlayerDailyReward, Task, PlayerTask
+from datetime import timedelta
+from .authentication import (
+    PlayerTokenAuthentication, PlayerToken, SESSION_KEY, TelegramAuth, TelegramInitDataAuthentication,
+    issue_player_token, revoke_player_token, revoke_player_tokens, verify_player_token
+)
+from .models import Player, PlayerUpgrade, PlayerDailyReward
+from .clicks import apply_clicks, settle_click_batch, expand_taps, BatchRejected, BatchConflict
+from .catalog import get_catalog
+from .click_buffer import get_store, merge_pending
+from .daily_rewards import DailyRewardRejected, claim_streak_reward, current_reward_day
+from .conditional import make_etag, not_modified, tag_response
+from .player_cache import get_player_cache
 from .serializers import (
-    PlayerSerializer, UpgradeSerializer, PlayerUpgradeSerializer,
-    DailyRewardSerializer, PlayerDailyRewardSerializer, TaskSerializer,
-    PlayerTaskSerializer, ClickSerializer, UpgradePurchaseSerializer
+    PlayerSerializer, PlayerUpgradeSerializer, PlayerDailyRewardSerializer,
+    PlayerTaskSerializer, ClickBatchSerializer
 )
+from .payloads import PayloadError, parse_bulk_purchase, parse_click, parse_purchase, parse_sync
+from .purchases import CostMismatch, PurchaseRejected, purchase_levels
+from .stats import get_player_stats
+from .task_progress import complete_tasks, task_counter
+from .task_rewards import claim_one_task_reward, claim_task_rewards
+from .task_state import TaskClaimRejected, TaskState, get_task_store
 
 
 # Simple views for rendering templates
@@ -26,14 +44,14 @@ def index(request):
             # Create player profile if it doesn't exist
             player = Player.objects.create(user=request.user)
         
-        # Update energy before returning data
-        player.update_energy()
-        
         context = {
             'player': {
                 'balance': player.balance,
-                'energy': player.energy,
-                'max_energy': player.max_energy
+                'energy': player.get_current_energy(),
+                'max_energy': player.max_energy,
+                'energy_regen_rate': player.energy_regen_rate,
+                'coins_per_click': player.coins_per_click,
+                'last_click_seq': player.last_click_seq
             }
         }
     else:
@@ -42,7 +60,10 @@ def index(request):
             'player': {
                 'balance': 1000,
                 'energy': 50,
-                'max_energy': 100
+                'max_energy': 100,
+                'energy_regen_rate': 1,
+                'coins_per_click': 1,
+                'last_click_seq': 0
             }
         }
     
@@ -55,22 +76,22 @@ def tasks(request):
         try:
             player = request.user.player
             # Get all active tasks
-            tasks = Task.objects.filter(is_active=True)
+            tasks = get_catalog().tasks
             
             # Get player's task progress
-            player_tasks = PlayerTask.objects.filter(player=player, task__in=tasks)
-            player_tasks_dict = {pt.task_id: pt for pt in player_tasks}
+            states = get_task_store().states(player.pk, tasks)
             
             # Prepare tasks data
             tasks_data = []
             for task in tasks:
-                player_task = player_tasks_dict.get(task.id)
+                state = states.get(task.id)
+                is_completed = state is not None or task_counter(player, task) >= task.target_value
                 task_data = {
                     'id': task.id,
                     'name': task.name,
                     'description': task.description,
-                    'is_completed': player_task.is_completed if player_task else False,
-                    'in_progress': player_task is not None and not player_task.is_completed if player_task else False
+                    'is_completed': is_completed,
+                    'in_progress': not is_completed and task_counter(player, task) > 0
                 }
                 tasks_data.append(task_data)
         except Player.DoesNotExist:
@@ -122,7 +143,7 @@ def upgrades(request):
         try:
             player = request.user.player
             # Get all active upgrades
-            upgrades = Upgrade.objects.filter(is_active=True)
+            upgrades = get_catalog().upgrades
             
             # Get player's upgrade levels
             player_upgrades = PlayerUpgrade.objects.filter(player=player, upgrade__in=upgrades)
@@ -201,25 +222,10 @@ def daily_reward(request):
         try:
             player = request.user.player
             # Get all rewards
-            rewards = DailyReward.objects.all().order_by('day')
-            
-            # Get player's claimed rewards
-            player_rewards = PlayerDailyReward.objects.filter(player=player).order_by('-claimed_at')
-            last_claim = player_rewards.first()
+            rewards = get_catalog().daily_rewards
             
-            # Determine current day
-            if last_claim:
-                if last_claim.claimed_at.date() == timezone.now().date():
-                    # Already claimed today
-                    current_day = last_claim.reward.day
-                else:
-                    # Next day
-                    current_day = last_claim.reward.day + 1
-                    if current_day > 7:
-                        current_day = 1
-            else:
-                # First claim
-                current_day = 1
+            # Determine current day from the player's streak
+            current_day = current_reward_day(player, get_catalog().daily_rewards_by_day)
             
             # Prepare reward days data
             reward_days_data = []
@@ -264,6 +270,10 @@ def daily_reward(request):
     return render(request, 'clicker/daily_reward.html', context)
 
 
+# How stale Player.last_login may get before player_profile rewrites it
+LAST_LOGIN_RESOLUTION = timedelta(minutes=5)
+
+
 # Player Views
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -271,21 +281,46 @@ def player_profile(request):
     """
     Get player profile information
     """
-    try:
-        player = request.user.player
-    except Player.DoesNotExist:
+    player_cache = get_player_cache()
+    player = player_cache.get(request.user.id)
+    if player is None:
         # Create player profile if it doesn't exist
-        player = Player.objects.create(user=request.user)
-    
-    # Update last login
-    player.last_login = timezone.now()
-    player.save()
+        Player.objects.create(user=request.user)
+        player = player_cache.get(request.user.id)
+    
+    # Update last login, at most once every few minutes
+    now = timezone.now()
+    if now - player.last_login > LAST_LOGIN_RESOLUTION:
+        Player.objects.filter(pk=player.pk).update(
+            last_login=now, version=F('version') + 1
+        )
+        player_cache.invalidate(request.user.id)
+        player = player._replace(last_login=now, version=player.version + 1)
     
-    # Update energy before returning data
-    player.update_energy()
+    # Energy regenerates and clicks buffer without a version bump
+    store = get_store()
+    pending = store.pending(player.pk) if store else (0, 0)
+    etag = make_etag('player', player.pk, player.version, player.get_current_energy(), *pending)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
     
     serializer = PlayerSerializer(player)
-    return Response(serializer.data)
+    return tag_response(Response(merge_pending(store, player, serializer.data, pending)), etag)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def player_stats(request):
+    """
+    Get the player's stats as derived from their upgrade levels
+    """
+    player = get_player_cache().get(request.user.id)
+    if player is None:
+        return Response({'error': 'Player profile not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    return Response(get_player_stats(player.pk)._asdict())
 
 
 @api_view(['POST'])
@@ -294,46 +329,97 @@ def sync_player_state(request):
     """
     Sync client state with server
     """
+    try:
+        payload = parse_sync(request.data)
+    except PayloadError as e:
+        return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    
     try:
         player = request.user.player
     except Player.DoesNotExist:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
+    # Clicks still sitting in the click buffer are part of the current state
+    store = get_store()
+    pending_energy, pending_balance = store.pending(player.pk) if store else (0, 0)
+    
     # Validate and update player state
-    energy = request.data.get('energy', player.energy)
-    balance = request.data.get('balance', player.balance)
+    energy = payload.energy
+    if energy is None:
+        energy = player.get_current_energy() - pending_energy
+    balance = payload.balance
+    if balance is None:
+        balance = player.balance + pending_balance
     
     # Validate energy (can't exceed max_energy)
     energy = min(energy, player.max_energy)
     
-    # Update player state
-    player.energy = energy
-    player.balance = balance
+    # Update player state, leaving room for the pending deltas to be flushed
+    old_balance = player.balance
+    player.energy = energy + pending_energy
+    player.balance = balance - pending_balance
     player.last_energy_update = timezone.now()
-    player.save(update_fields=['energy', 'balance', 'last_energy_update'])
+    player.save(update_fields=['energy', 'balance', 'last_energy_update'] + player.bump_version())
+    complete_tasks([(player.pk, 'balance', old_balance, player.balance)])
     
     serializer = PlayerSerializer(player)
-    return Response(serializer.data)
+    return Response(merge_pending(store, player, serializer.data))
 
 
 # Click Views
 @api_view(['POST'])
-@authentication_classes([SessionAuthentication, BasicAuthentication])
+@authentication_classes([
+    PlayerTokenAuthentication, TelegramInitDataAuthentication, SessionAuthentication, BasicAuthentication
+])
 @permission_classes([IsAuthenticated])
 def process_click(request):
     """
     Process a click action
     """
-    # Make a copy of the data to modify it
-    data = request.data.copy()
+    try:
+        payload = parse_click(request.data)
+    except PayloadError as e:
+        return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    player = get_player_cache().get(request.user.id)
+    if player is None:
+        return Response({'error': 'Player profile not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    clicks = payload.clicks
+    timestamp = payload.timestamp
     
-    # If timestamp is a string, parse it
-    if isinstance(data.get('timestamp'), str):
-        from django.utils.dateparse import parse_datetime
-        data['timestamp'] = parse_datetime(data['timestamp'])
+    # Validate timestamp (should be recent)
+    time_diff = abs((timezone.now() - timestamp).total_seconds())
+    if time_diff > 30:  # More than 30 seconds old
+        return Response({'error': 'Invalid timestamp'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
     
-    serializer = ClickSerializer(data=data)
+    result = apply_clicks(player, clicks, client_ts=timestamp)
+    if result is None:
+        return Response({'error': 'Not enough energy'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    # Return updated player state
+    balance, energy, max_energy = result
+    return Response({
+        'balance': balance,
+        'energy': energy,
+        'max_energy': max_energy
+    })
+
+
+@api_view(['POST'])
+@authentication_classes([
+    PlayerTokenAuthentication, TelegramInitDataAuthentication, SessionAuthentication, BasicAuthentication
+])
+@permission_classes([IsAuthenticated])
+def process_click_batch(request):
+    """
+    Process a run of taps collected by the client (protocol v2)
+    """
+    serializer = ClickBatchSerializer(data=request.data)
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
@@ -343,33 +429,46 @@ def process_click(request):
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    clicks = serializer.validated_data['clicks']
-    client_energy = serializer.validated_data['energy']
-    client_balance = serializer.validated_data['balance']
-    timestamp = serializer.validated_data['timestamp']
+    data = serializer.validated_data
+    now = timezone.now()
     
-    # Validate energy
-    if player.energy < clicks:
-        return Response({'error': 'Not enough energy'}, 
+    # Validate timestamps (the run should be recent and not in the future)
+    first_ts = data['first_ts'] / 1000
+    last_ts = data['last_ts'] / 1000
+    if first_ts < now.timestamp() - 60 or last_ts > now.timestamp() + 5:
+        return Response({'error': 'Invalid timestamp'}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Validate timestamp (should be recent)
-    time_diff = abs((timezone.now() - timestamp).total_seconds())
-    if time_diff > 30:  # More than 30 seconds old
-        return Response({'error': 'Invalid timestamp'}, 
+    if data['timestamps'] is not None:
+        taps = [timestamp / 1000 for timestamp in data['timestamps']]
+    else:
+        taps = list(expand_taps(data['count'], first_ts, last_ts))
+    
+    store = get_store()
+    pending_energy, pending_balance = store.pending(player.pk) if store else (0, 0)
+    
+    try:
+        result = settle_click_batch(
+            player, data['seq'], data['count'], taps,
+            pending_energy=pending_energy, now=now
+        )
+    except BatchConflict as e:
+        return Response({
+            'error': str(e),
+            'last_seq': player.last_click_seq
+        }, status=status.HTTP_409_CONFLICT)
+    except BatchRejected as e:
+        return Response({'error': str(e)}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Update player
-    player.energy -= clicks
-    player.balance += clicks * player.coins_per_click
-    player.last_energy_update = timezone.now()
-    player.save(update_fields=['energy', 'balance', 'last_energy_update'])
+    get_player_cache().invalidate(request.user.id)
     
-    # Return updated player state
     return Response({
-        'balance': player.balance,
-        'energy': player.energy,
-        'max_energy': player.max_energy
+        'accepted': result.accepted,
+        'seq': result.seq,
+        'balance': result.balance + pending_balance,
+        'energy': result.energy,
+        'max_energy': result.max_energy
     })
 
 
@@ -378,11 +477,14 @@ def process_click(request):
 @permission_classes([IsAuthenticated])
 def list_upgrades(request):
     """
-    List all available upgrades
+    List all available upgrades, pre-serialized by the catalog cache
     """
-    upgrades = Upgrade.objects.filter(is_active=True)
-    serializer = UpgradeSerializer(upgrades, many=True)
-    return Response(serializer.data)
+    catalog = get_catalog()
+    etag = make_etag('upgrades', catalog.upgrades_fingerprint)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    return tag_response(HttpResponse(catalog.upgrades_json, content_type='application/json'), etag)
 
 
 @api_view(['POST'])
@@ -391,192 +493,220 @@ def purchase_upgrade(request):
     """
     Purchase an upgrade
     """
-    serializer = UpgradePurchaseSerializer(data=request.data)
-    if not serializer.is_valid():
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-    
     try:
-        player = request.user.player
-    except Player.DoesNotExist:
+        payload = parse_purchase(request.data)
+    except PayloadError as e:
+        return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    player = get_player_cache().get(request.user.id)
+    if player is None:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    upgrade_id = serializer.validated_data['upgrade_id']
-    expected_cost = serializer.validated_data['expected_cost']
-    
-    try:
-        upgrade = Upgrade.objects.get(id=upgrade_id, is_active=True)
-    except Upgrade.DoesNotExist:
+    upgrade = get_catalog().upgrades_by_id.get(payload.upgrade_id)
+    if upgrade is None:
         return Response({'error': 'Upgrade not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Get current upgrade level for player
-    player_upgrade, created = PlayerUpgrade.objects.get_or_create(
-        player=player, upgrade=upgrade,
-        defaults={'level': 0}
-    )
+    # Clicks not yet written back count towards the balance
+    store = get_store()
+    pending_balance = store.pending(player.pk)[1] if store else 0
     
-    # Calculate actual cost
-    actual_cost = upgrade.get_cost(player_upgrade.level)
-    if actual_cost is None:
-        return Response({'error': 'Upgrade already at max level'}, 
+    # Lock the player, charge the cost, apply the effect and raise the level
+    # in one transaction
+    try:
+        result = purchase_levels(
+            player.pk, upgrade, levels=1, expected_cost=payload.expected_cost,
+            pending_balance=pending_balance
+        )
+    except CostMismatch as e:
+        return Response({'error': 'Cost mismatch', 'actual_cost': e.actual_cost}, 
                        status=status.HTTP_400_BAD_REQUEST)
-    
-    # Validate expected cost matches actual cost
-    if expected_cost != actual_cost:
-        return Response({'error': 'Cost mismatch', 'actual_cost': actual_cost}, 
+    except PurchaseRejected as e:
+        return Response({'error': str(e)}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if player has enough coins
-    if player.balance < actual_cost:
-        return Response({'error': 'Not enough coins'}, 
-                       status=status.HTTP_400_BAD_REQUEST)
-    
-    # Process purchase
-    player.balance -= actual_cost
-    player_upgrade.level += 1
-    player_upgrade.purchased_at = timezone.now()
-    player_upgrade.save()
-    player.save()
-    
-    # Apply upgrade effect
-    if upgrade.upgrade_type == 'coins_per_click':
-        player.coins_per_click += upgrade.base_effect_value + (upgrade.effect_per_level * (player_upgrade.level - 1))
-    elif upgrade.upgrade_type == 'max_energy':
-        player.max_energy += upgrade.base_effect_value + (upgrade.effect_per_level * (player_upgrade.level - 1))
-        # Restore energy to new max if it was at max
-        if player.energy == player.max_energy - upgrade.base_effect_value:
-            player.energy = player.max_energy
-    elif upgrade.upgrade_type == 'energy_regen':
-        player.energy_regen_rate += upgrade.base_effect_value + (upgrade.effect_per_level * (player_upgrade.level - 1))
-    
-    player.save(update_fields=['coins_per_click', 'max_energy', 'energy_regen_rate'])
-    
     # Return updated player and upgrade info
-    player_serializer = PlayerSerializer(player)
-    upgrade_serializer = PlayerUpgradeSerializer(player_upgrade)
+    player_serializer = PlayerSerializer(result.player)
+    upgrade_serializer = PlayerUpgradeSerializer(result.player_upgrade)
     
     return Response({
-        'player': player_serializer.data,
+        'player': merge_pending(store, result.player, player_serializer.data),
         'upgrade': upgrade_serializer.data
     })
 
 
-# Daily Reward Views
-@api_view(['GET'])
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def daily_rewards_status(request):
+def purchase_upgrade_levels(request):
     """
-    Get daily reward status
+    Buy several levels of an upgrade at once: {"upgrade_id": 1, "levels": 10},
+    or as many as the balance allows with {"upgrade_id": 1, "levels": "max"}
     """
     try:
-        player = request.user.player
-    except Player.DoesNotExist:
+        payload = parse_bulk_purchase(request.data)
+    except PayloadError as e:
+        return Response(e.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    player = get_player_cache().get(request.user.id)
+    if player is None:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Get all rewards
-    rewards = DailyReward.objects.all()
-    rewards_serializer = DailyRewardSerializer(rewards, many=True)
+    upgrade = get_catalog().upgrades_by_id.get(payload.upgrade_id)
+    if upgrade is None:
+        return Response({'error': 'Upgrade not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
     
-    # Get player's claimed rewards
-    player_rewards = PlayerDailyReward.objects.filter(player=player)
-    player_rewards_serializer = PlayerDailyRewardSerializer(player_rewards, many=True)
+    # Clicks not yet written back count towards the balance
+    store = get_store()
+    pending_balance = store.pending(player.pk)[1] if store else 0
+    
+    try:
+        result = purchase_levels(
+            player.pk, upgrade, levels=payload.levels, pending_balance=pending_balance
+        )
+    except PurchaseRejected as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_400_BAD_REQUEST)
     
     return Response({
-        'rewards': rewards_serializer.data,
-        'player_rewards': player_rewards_serializer.data
+        'player': merge_pending(store, result.player, PlayerSerializer(result.player).data),
+        'upgrade': PlayerUpgradeSerializer(result.player_upgrade).data,
+        'levels': result.levels,
+        'cost': result.cost
     })
 
 
+# Daily Reward Views
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def daily_rewards_status(request):
+    """
+    Get daily reward status
+    """
+    player = get_player_cache().get(request.user.id)
+    if player is None:
+        return Response({'error': 'Player profile not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    # Claims and the history writes after them bump the player's version;
+    # whether today's reward is claimed also turns with the date
+    catalog = get_catalog()
+    today = timezone.now().date()
+    etag = make_etag('rewards', catalog.daily_rewards_fingerprint, player.pk, player.version, today)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    
+    # Get the claims of the current cycle only; older history is summarized
+    # by the counters on the player, so the response does not grow
+    player_rewards = []
+    if player.daily_streak_day:
+        player_rewards = PlayerDailyReward.objects.filter(player_id=player.pk).select_related(
+            'reward'
+        ).order_by('-claimed_at')[:player.daily_streak_day]
+    player_rewards_serializer = PlayerDailyRewardSerializer(reversed(player_rewards), many=True)
+    
+    return tag_response(Response({
+        'rewards': catalog.daily_rewards_data,
+        'player_rewards': player_rewards_serializer.data,
+        'current_day': current_reward_day(player, catalog.daily_rewards_by_day, today),
+        'streak_day': player.daily_streak_day,
+        'claimed_today': player.last_daily_claim_date == today,
+        'total_claims': player.daily_rewards_claimed
+    }), etag)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def claim_daily_reward(request):
     """
     Claim daily reward
     """
-    try:
-        player = request.user.player
-    except Player.DoesNotExist:
+    player = get_player_cache().get(request.user.id)
+    if player is None:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Determine which day reward to give (based on last claim)
-    last_claim = PlayerDailyReward.objects.filter(player=player).order_by('-claimed_at').first()
-    
-    if last_claim:
-        # Check if already claimed today
-        if last_claim.claimed_at.date() == timezone.now().date():
-            return Response({'error': 'Reward already claimed today'}, 
-                           status=status.HTTP_400_BAD_REQUEST)
-        
-        # Calculate next day
-        next_day = last_claim.reward.day + 1
-    else:
-        # First claim
-        next_day = 1
-    
+    # The streak is kept on the player: one guarded UPDATE, no history reads
     try:
-        reward = DailyReward.objects.get(day=next_day)
-    except DailyReward.DoesNotExist:
-        # Reset to day 1 if sequence is broken
-        reward = DailyReward.objects.get(day=1)
-    
-    # Award reward
-    if reward.reward_type == 'coins':
-        player.balance += reward.reward_amount
-        player.save(update_fields=['balance'])
-    
-    # Record claim
-    player_reward = PlayerDailyReward.objects.create(
-        player=player,
-        reward=reward,
-        is_consecutive=last_claim is not None and last_claim.reward.day == next_day - 1
-    )
+        claim = claim_streak_reward(player)
+    except DailyRewardRejected as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_400_BAD_REQUEST)
     
-    # Return updated player and reward info
+    # Return updated player and reward info; the history row is written later
+    player = player._replace(
+        balance=claim.balance, daily_streak_day=claim.reward.day,
+        last_daily_claim_date=claim.claimed_at.date(),
+        daily_rewards_claimed=player.daily_rewards_claimed + 1
+    )
     player_serializer = PlayerSerializer(player)
-    reward_serializer = PlayerDailyRewardSerializer(player_reward)
+    reward_serializer = PlayerDailyRewardSerializer(PlayerDailyReward(
+        player_id=player.pk, reward=claim.reward, claimed_at=claim.claimed_at,
+        is_consecutive=claim.is_consecutive
+    ))
     
     return Response({
-        'player': player_serializer.data,
+        'player': merge_pending(get_store(), player, player_serializer.data),
         'reward': reward_serializer.data
     })
 
 
 # Task Views
+_completed_at_field = PlayerTaskSerializer().fields['completed_at']
+
+
+def player_task_data(task_data, state=None, counter=0):
+    """
+    PlayerTaskSerializer output built around an already serialized task and
+    the player's TaskState for it. A task not completed yet reports the
+    player's ``counter`` for its type as progress.
+    """
+    if state is not None and state.is_completed:
+        progress = state.progress if state.progress is not None else max(counter, task_data['target_value'])
+        is_completed, completed_at = True, state.completed_at
+    else:
+        progress, is_completed, completed_at = counter, counter >= task_data['target_value'], None
+    return {
+        'id': state.id if state is not None else None,
+        'task': task_data,
+        'progress': progress,
+        'is_completed': is_completed,
+        'completed_at': _completed_at_field.to_representation(completed_at) if completed_at else None,
+    }
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_tasks(request):
     """
     List all tasks with player progress
     """
-    try:
-        player = request.user.player
-    except Player.DoesNotExist:
+    player = get_player_cache().get(request.user.id)
+    if player is None:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Get all active tasks
-    tasks = Task.objects.filter(is_active=True)
+    # Get all active tasks; task progress changes bump the player's version
+    catalog = get_catalog()
+    etag = make_etag('tasks', catalog.tasks_fingerprint, player.pk, player.version)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
     
-    # Get player's task progress
-    player_tasks = PlayerTask.objects.filter(player=player, task__in=tasks)
-    player_tasks_dict = {pt.task_id: pt for pt in player_tasks}
+    # Get player's task progress, one query in either storage mode
+    states = get_task_store().states(player.pk, catalog.tasks)
     
-    # Prepare response data
+    # Prepare response data; task bodies come pre-serialized from the catalog
     task_data = []
-    for task in tasks:
-        player_task = player_tasks_dict.get(task.id)
-        if player_task:
-            task_serializer = PlayerTaskSerializer(player_task)
-        else:
-            # Create a default player task
-            player_task = PlayerTask(player=player, task=task)
-            task_serializer = PlayerTaskSerializer(player_task)
-        task_data.append(task_serializer.data)
+    for task in catalog.tasks:
+        task_data.append(player_task_data(
+            catalog.tasks_data[task.id], states.get(task.id), task_counter(player, task)
+        ))
     
-    return Response(task_data)
+    return tag_response(Response(task_data), etag)
 
 
 @api_view(['POST'])
@@ -586,7 +716,7 @@ def claim_task_reward(request):
     Claim reward for completed task
     """
     try:
-        player = request.user.player
+        player_id = Player.objects.values_list('pk', flat=True).get(user_id=request.user.id)
     except Player.DoesNotExist:
         return Response({'error': 'Player profile not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
@@ -597,41 +727,73 @@ def claim_task_reward(request):
                        status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        task = Task.objects.get(id=task_id, is_active=True)
-        player_task, created = PlayerTask.objects.get_or_create(
-            player=player, task=task,
-            defaults={'progress': 0, 'is_completed': False}
-        )
-    except Task.DoesNotExist:
+        task = get_catalog().tasks_by_id[int(task_id)]
+    except (KeyError, TypeError, ValueError):
         return Response({'error': 'Task not found'}, 
                        status=status.HTTP_404_NOT_FOUND)
     
-    # Check if task is completed
-    if not player_task.is_completed:
-        return Response({'error': 'Task not completed'}, 
+    # Mark the reward claimed and award it together; the store lets a
+    # reward be claimed only once
+    try:
+        result = claim_one_task_reward(player_id, task)
+    except TaskClaimRejected as e:
+        return Response({'error': str(e)}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
-    # Check if reward already claimed
-    if player_task.completed_at is not None:
-        return Response({'error': 'Reward already claimed'}, 
-                       status=status.HTTP_400_BAD_REQUEST)
+    # Return updated player and task info
+    player_serializer = PlayerSerializer(result.player)
     
-    # Award reward
-    player.balance += task.reward_coins
-    player.energy = min(player.energy + task.reward_energy, player.max_energy)
-    player.save(update_fields=['balance', 'energy'])
+    return Response({
+        'player': merge_pending(get_store(), result.player, player_serializer.data),
+        'task': player_task_data(get_catalog().tasks_data[task.id], result.state, result.counter)
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def claim_all_task_rewards(request):
+    """
+    Claim the rewards of all completed tasks at once
+    """
+    try:
+        player_id = Player.objects.values_list('pk', flat=True).get(user_id=request.user.id)
+    except Player.DoesNotExist:
+        return Response({'error': 'Player profile not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
     
-    # Mark reward as claimed
-    player_task.completed_at = timezone.now()
-    player_task.save()
+    try:
+        result = claim_task_rewards(player_id)
+    except TaskClaimRejected as e:
+        return Response({'error': str(e)}, 
+                       status=status.HTTP_409_CONFLICT)
     
-    # Return updated player and task info
-    player_serializer = PlayerSerializer(player)
-    task_serializer = PlayerTaskSerializer(player_task)
+    # Return updated player and the claimed tasks
+    catalog = get_catalog()
+    player_serializer = PlayerSerializer(result.player)
+    state = TaskState(None, None, True, result.claimed_at)
     
     return Response({
-        'player': player_serializer.data,
-        'task': task_serializer.data
+        'player': merge_pending(get_store(), result.player, player_serializer.data),
+        'tasks': [
+            player_task_data(catalog.tasks_data[task.id], state, result.counters[task.id])
+            for task in result.tasks
+        ],
+        'reward_coins': result.coins,
+        'reward_energy': result.energy
+    })
+
+
+# Monitoring Views
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """
+    Hit/miss/eviction counters of this worker's in-process caches
+    """
+    catalog = get_catalog()
+    return Response({
+        'player_state': get_player_cache().stats(),
+        'catalog': {'version': catalog.version, 'built_at': catalog.built_at}
     })
 
 
@@ -645,9 +807,56 @@ def logout_view(request):
     """
     Handle logout via POST request
     """
+    # Revoke the player token issued for this session
+    token = request.session.get(SESSION_KEY)
+    if token:
+        try:
+            revoke_player_token(verify_player_token(token))
+        except AuthenticationFailed:
+            pass
     logout(request)
     return Response({'success': True})
 
+
+@api_view(['POST'])
+@authentication_classes([TelegramInitDataAuthentication, SessionAuthentication, BasicAuthentication])
+@permission_classes([IsAuthenticated])
+def issue_token(request):
+    """
+    Exchange Telegram init data, a session or username/password for a
+    signed player token
+    """
+    player_id = request.auth.player_id if isinstance(request.auth, TelegramAuth) else None
+    try:
+        token, payload = issue_player_token(request.user, player_id=player_id)
+    except Player.DoesNotExist:
+        return Response({'error': 'Player profile not found'}, 
+                       status=status.HTTP_404_NOT_FOUND)
+    
+    return Response({
+        'token': token,
+        'player_id': payload.player_id,
+        'expires_at': payload.expires_at // 1000
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def revoke_token(request):
+    """
+    Revoke the player token used for this request, or with {"all": true}
+    every token of the user
+    """
+    if request.data.get('all'):
+        revoke_player_tokens(request.user.id)
+    elif isinstance(request.auth, PlayerToken):
+        revoke_player_token(request.auth)
+    else:
+        return Response({'error': 'No player token to revoke'}, 
+                       status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({'success': True})
+
 def register(request):
     """
     Handle user registration
@@ -64,12 +64,14 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'clicker_app.context_processors.player_token',
             ],
         },
     },
 ]
 
 WSGI_APPLICATION = 'django_app.wsgi.application'
+ASGI_APPLICATION = 'django_app.asgi.application'
 
 
 # Database
@@ -126,17 +128,20 @@ STATIC_URL = 'static/'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'clicker_app.authentication.PlayerTokenAuthentication',
+        'clicker_app.authentication.TelegramInitDataAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson-backed JSON, falling back to the stdlib when orjson is missing
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'clicker_app.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'clicker_app.parsers.FastJSONParser',
     ],
 }
 
@@ -154,3 +159,96 @@ CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 # Authentication settings
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'
+
+# Clicker game
+# Write-behind click buffer: clicks are kept as pending per-player deltas and
+# flushed to the Player table by the flush_clicks task. BACKEND is 'redis'
+# (shared by all workers), 'shards' (SHARDS counter rows per player in the
+# database, so hot players do not serialize on their Player row lock) or
+# 'memory' (single process, used by tests).
+CLICKER_CLICK_BUFFER = {
+    'ENABLED': False,
+    'BACKEND': 'redis',
+    'REDIS_URL': 'redis://127.0.0.1:6379/1',
+    'BATCH_SIZE': 500,
+    'SHARDS': 8,
+    'FLUSH_LOCK_TIMEOUT': 60,  # Seconds; must exceed the longest flush
+}
+
+# Per-worker LRU + TTL cache of hot Player fields. SHARED_CACHE names a
+# CACHES alias (e.g. Redis) used for cross-process version stamps; without
+# it other workers may serve a player's state up to TTL seconds stale.
+CLICKER_PLAYER_CACHE = {
+    'MAX_SIZE': 10000,
+    'TTL': 5.0,
+    'SHARED_CACHE': None,
+}
+
+# Channel layer used to push state changes to open game sockets. The
+# in-memory layer only reaches sockets in the same process; use
+# channels_redis in production so Celery workers and other web workers
+# can push too.
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels.layers.InMemoryChannelLayer',
+    },
+}
+
+# Append-only click event log. Events are buffered per worker and written
+# in batches (COPY on PostgreSQL) after responses are sent; the
+# maintain_click_events task drops daily partitions older than RETENTION_DAYS.
+CLICKER_CLICK_LOG = {
+    'ENABLED': True,
+    'BATCH_SIZE': 1000,
+    'FLUSH_INTERVAL': 1.0,
+    'RETENTION_DAYS': 30,
+}
+
+# Player stats derived from upgrade levels; computed records are cached in
+# the CACHE alias for TIMEOUT seconds and dropped on purchase.
+CLICKER_PLAYER_STATS = {
+    'CACHE': 'default',
+    'TIMEOUT': 60 * 60,
+}
+
+# Upgrade, task and daily reward catalog held in memory by every worker.
+# Edits bump a version stamp in the SHARED_CACHE alias, which workers check
+# every CHECK_INTERVAL seconds before rebuilding their snapshot.
+CLICKER_CATALOG = {
+    'SHARED_CACHE': 'default',
+    'CHECK_INTERVAL': 1.0,
+}
+
+# Per-player task state: 'rows' keeps a PlayerTask row per task, 'bitmap'
+# packs completed and claimed flags into one PlayerTaskState row per player.
+# Run migrate_task_state before switching an existing database to 'bitmap'.
+CLICKER_TASK_STATE = {
+    'STORAGE': 'rows',
+}
+
+# Daily reward streaks are kept on the player; claim history rows are
+# buffered per worker and written in batches of HISTORY_BATCH_SIZE or every
+# HISTORY_FLUSH_INTERVAL seconds, then compacted into monthly summaries
+# after RETENTION_DAYS.
+CLICKER_DAILY_REWARDS = {
+    'HISTORY_BATCH_SIZE': 500,
+    'HISTORY_FLUSH_INTERVAL': 1.0,
+    'RETENTION_DAYS': 90,
+}
+
+# Signed player tokens (Authorization: Player <token>), verified without
+# database queries. Revoked tokens are kept in the CACHE alias, which must
+# be shared by all workers (e.g. Redis) for revocation to apply everywhere.
+CLICKER_PLAYER_TOKEN = {
+    'TTL': 7 * 24 * 60 * 60,
+    'CACHE': 'default',
+}
+
+# Telegram WebApp login: "Authorization: tma <initData>" is verified against
+# BOT_TOKEN locally and initData older than MAX_AGE seconds is refused.
+# CACHE_SIZE bounds the per-worker telegram_id -> player index.
+CLICKER_TELEGRAM = {
+    'BOT_TOKEN': '',  # Empty disables Telegram authentication
+    'MAX_AGE': 24 * 60 * 60,
+    'CACHE_SIZE': 100000,
+}
@@ -2,6 +2,7 @@ from django.urls import path, include
 from django.contrib import admin
 from rest_framework import routers
 from clicker_app import views as clicker_views
+from clicker_app import async_views as clicker_async_views
 
 
 urlpatterns = [
@@ -12,11 +13,23 @@ urlpatterns = [
     # Clicker app API endpoints
     path('api/player/', clicker_views.player_profile, name='player_profile'),
     path('api/player/sync/', clicker_views.sync_player_state, name='sync_player_state'),
+    path('api/player/stats/', clicker_views.player_stats, name='player_stats'),
     path('api/click/', clicker_views.process_click, name='process_click'),
+    path('api/v2/click/batch/', clicker_views.process_click_batch, name='process_click_batch'),
     path('api/upgrades/', clicker_views.list_upgrades, name='list_upgrades'),
     path('api/upgrades/purchase/', clicker_views.purchase_upgrade, name='purchase_upgrade'),
+    path('api/upgrades/purchase/bulk/', clicker_views.purchase_upgrade_levels, name='purchase_upgrade_levels'),
     path('api/daily-rewards/', clicker_views.daily_rewards_status, name='daily_rewards_status'),
     path('api/daily-rewards/claim/', clicker_views.claim_daily_reward, name='claim_daily_reward'),
     path('api/tasks/', clicker_views.list_tasks, name='list_tasks'),
     path('api/tasks/claim/', clicker_views.claim_task_reward, name='claim_task_reward'),
+    path('api/tasks/claim-all/', clicker_views.claim_all_task_rewards, name='claim_all_task_rewards'),
+    path('api/stats/cache/', clicker_views.cache_stats, name='cache_stats'),
+    path('api/auth/token/', clicker_views.issue_token, name='issue_token'),
+    path('api/auth/token/revoke/', clicker_views.revoke_token, name='revoke_token'),
+    
+    # Async endpoints, served without holding a thread under ASGI
+    path('api/async/player/', clicker_async_views.player_profile, name='async_player_profile'),
+    path('api/async/player/sync/', clicker_async_views.sync_player_state, name='async_sync_player_state'),
+    path('api/async/click/', clicker_async_views.process_click, name='async_process_click'),
 ]
\ No newline at end of file